@@ -11,7 +11,9 @@ from .models import (
     Question,
     Subscription,
     Donation,
-    Notification
+    Notification,
+    OutboxMessage,
+    UserNotification
 )
 from tg_bot.notifications import get_notification_service
 
@@ -49,34 +51,10 @@ class EventAdmin(admin.ModelAdmin):
             f"/admin/datacenter/event/{event.id}/program-change/"
         )
 
-    def program_change_view(self, request, object_id):
-        from .models import Event
-        from .notifications import get_notification_service
-    
-        event = Event.objects.get(id=object_id)
-    
-        if request.method == 'POST':
-            change_description = request.POST.get('change_description', '')
-            if change_description:
-                notification_service = get_notification_service()
-                sent_count = notification_service.send_program_change_notification(event, change_description)
-                messages.success(request, f"Уведомление отправлено {sent_count} подписчикам")
-                return HttpResponseRedirect("/admin/datacenter/event/")
-            else:
-                messages.error(request, "Пожалуйста, введите описание изменений")
-    
-        context = {
-            'title': f'Уведомление об изменении программы: {event.title}',
-            'event': event,
-            'opts': self.model._meta,
-            'has_view_permission': self.has_view_permission(request),
-        }
-        return render(request, 'admin/program_change_notification.html', context)
-
     def send_new_event_notification(self, request, queryset):
         sent_count = 0
         for event in queryset:
-            count = notification_service.send_new_event_notification(event)
+            count = get_notification_service().send_new_event_notification(event)
             sent_count += count
             self.message_user(request, f"Уведомления о мероприятии '{event.title}' отправлены {count} пользователям")
     send_new_event_notification.short_description = "Отправить уведомление о новом мероприятии"
@@ -87,7 +65,7 @@ class EventAdmin(admin.ModelAdmin):
             return
 
         event = queryset.first()
-        count = notification_service.send_reminder_notification(event)
+        count = get_notification_service().send_reminder_notification(event)
         self.message_user(request, f"Напоминания о мероприятии '{event.title}' отправлены {count} пользователям")
     send_reminder_notification.short_description = "Отправить напоминание о мероприятии"
 
@@ -109,7 +87,7 @@ class EventAdmin(admin.ModelAdmin):
         if request.method == 'POST':
             change_description = request.POST.get('change_description', '')
             if change_description:
-                sent_count = notification_service.send_program_change_notification(event, change_description)
+                sent_count = get_notification_service().send_program_change_notification(event, change_description)
                 messages.success(request, f"Уведомление отправлено {sent_count} подписчикам")
                 return HttpResponseRedirect("/admin/datacenter/event/")
             else:
@@ -168,7 +146,7 @@ class SpeechAdmin(admin.ModelAdmin):
     def send_speech_reminder(self, request, queryset):
         sent_count = 0
         for speech in queryset:
-            count = notification_service.send_reminder_notification(speech.event, speech)
+            count = get_notification_service().send_reminder_notification(speech.event, speech)
             sent_count += count
             self.message_user(request, f"Напоминания о выступлении '{speech.title}' отправлены {count} пользователям")
     send_speech_reminder.short_description = "Отправить напоминание о выступлении"
@@ -178,7 +156,7 @@ class SpeechAdmin(admin.ModelAdmin):
 class ParticipantAdmin(admin.ModelAdmin):
     list_display = ('get_display_name', 'telegram_id', 'company', 'position', 'questions_count', 'registered_at')
     search_fields = ('full_name', 'username', 'company')
-    list_filter = ('experience', 'registered_at')
+    list_filter = ('experience', 'registered_at', 'is_reachable')
     date_hierarchy = 'registered_at'
     actions = ['export_telegram_ids']
 
@@ -189,6 +167,9 @@ class ParticipantAdmin(admin.ModelAdmin):
         ('Профессиональная информация', {
             'fields': ('company', 'position', 'experience')
         }),
+        ('Рассылки', {
+            'fields': ('is_reachable', 'unreachable_since')
+        }),
     )
 
     def get_display_name(self, obj):
@@ -247,7 +228,43 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ('notification_type', 'is_sent', 'created_at', 'event')
     search_fields = ('title', 'message')
     date_hierarchy = 'created_at'
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'claimed_at')
     
     def has_add_permission(self, request):
         return False
+
+
+@admin.register(UserNotification)
+class UserNotificationAdmin(admin.ModelAdmin):
+    list_display = ('participant', 'notification', 'status', 'attempts', 'received_at')
+    list_filter = ('status', 'notification__notification_type', 'received_at')
+    search_fields = ('participant__full_name', 'participant__username', 'notification__title')
+    readonly_fields = ('participant', 'notification', 'received_at', 'attempts', 'last_error')
+    actions = ['redeliver']
+
+    def has_add_permission(self, request):
+        return False
+
+    def redeliver(self, request, queryset):
+        records = list(
+            queryset.filter(status__in=('failed', 'dead'))
+            .select_related('participant', 'notification__event')
+        )
+        if not records:
+            self.message_user(request, "Среди выбранных нет недоставленных уведомлений.", level='warning')
+            return
+
+        delivered = get_notification_service().redeliver(records)
+        self.message_user(request, f"Повторно доставлено {delivered} из {len(records)} уведомлений")
+    redeliver.short_description = "Повторно отправить недоставленные"
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('event', 'kind', 'created_at', 'processed_at', 'attempts')
+    list_filter = ('kind', 'processed_at', 'event')
+    search_fields = ('message', 'event__title')
+    readonly_fields = ('created_at', 'processed_at', 'attempts', 'last_error')
+
+    def has_add_permission(self, request):
+        return False
@@ -1,36 +1,221 @@
 import logging
+import threading
+from queue import Queue
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from telegram.ext import Updater
+from telegram.ext import Dispatcher, JobQueue, Updater
 
-from tg_bot.config import TELEGRAM_BOT_TOKEN
+from tg_bot.aio import AsyncBotRuntime
 from tg_bot.common import register_common_handlers
+from tg_bot.config import TELEGRAM_WEBHOOK_SECRET
+from tg_bot.conversation_state import DatabasePersistence
+from tg_bot.dispatcher import OrderedDispatcher
+from tg_bot.notifications import get_bot
+from tg_bot.outbox import OutboxWorker
+from tg_bot.question_digest import QuestionDigestWorker
+from tg_bot.questions import question_buffer
+from tg_bot.reminders import ReminderScheduler
+from tg_bot.shutdown import Deadline, confirm_updates, wait_for_stop_signal
+from tg_bot.webhook import WebhookServer
 
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_DISPATCHER_WORKERS = 4
+DEFAULT_UPDATE_QUEUE_SIZE = 1000
+DEFAULT_SHUTDOWN_TIMEOUT = 25
+
 
 class Command(BaseCommand):
     help = 'Run the Telegram bot'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-outbox',
+            action='store_true',
+            help='Не отправлять уведомления из очереди (если запущен отдельный runoutbox)',
+        )
+        parser.add_argument(
+            '--no-reminders',
+            action='store_true',
+            help='Не отправлять автоматические напоминания о начале выступлений',
+        )
+        parser.add_argument(
+            '--no-question-digest',
+            action='store_true',
+            help='Не присылать спикерам новые вопросы, только по кнопке «Мои вопросы»',
+        )
+
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument(
+            '--polling',
+            action='store_true',
+            help='Получать обновления long polling (по умолчанию)',
+        )
+        mode.add_argument(
+            '--webhook',
+            action='store_true',
+            help='Принимать обновления от Telegram на встроенный HTTP-сервер',
+        )
+        mode.add_argument(
+            '--async',
+            action='store_true',
+            dest='async_mode',
+            help='Получать обновления long polling в цикле asyncio, обработчики выполняются в небольшом пуле потоков',
+        )
+        parser.add_argument('--host', default='127.0.0.1', help='Адрес HTTP-сервера для --webhook')
+        parser.add_argument('--port', type=int, default=8080, help='Порт HTTP-сервера для --webhook')
+        parser.add_argument('--webhook-path', default='/telegram', help='Путь, на который Telegram шлёт обновления')
+        parser.add_argument(
+            '--webhook-url',
+            help='Публичный адрес вебхука; если не задан, вебхук в Telegram не регистрируется',
+        )
+        parser.add_argument('--workers', type=int, help='Сколько обновлений из разных чатов обрабатывать параллельно')
+        parser.add_argument('--queue-size', type=int, help='Максимальная длина очереди обновлений')
+        parser.add_argument(
+            '--shutdown-timeout',
+            type=float,
+            help='Сколько секунд после SIGTERM дорабатывать полученные обновления и сохранять буферы',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write("Запуск телеграм бота...")
-        
+        outbox_worker = None
+        reminder_scheduler = None
+        question_digest = None
+        dispatcher = None
+        persistence = None
+
+        bot_settings = getattr(settings, "BOT_SETTINGS", {})
+        shutdown_timeout = options['shutdown_timeout']
+        if shutdown_timeout is None:
+            shutdown_timeout = bot_settings.get("shutdown_timeout", DEFAULT_SHUTDOWN_TIMEOUT)
+        # Срок общий для всех шагов остановки и отсчитывается с её начала
+        deadline = Deadline(shutdown_timeout)
+
         try:
-            updater = Updater(token=TELEGRAM_BOT_TOKEN, use_context=True)
-            dispatcher = updater.dispatcher
+            workers = options['workers'] or bot_settings.get(
+                "dispatcher_workers", DEFAULT_DISPATCHER_WORKERS
+            )
+            queue_size = options['queue_size'] or bot_settings.get(
+                "update_queue_size", DEFAULT_UPDATE_QUEUE_SIZE
+            )
+            # Каждому потоку обработчиков нужно своё соединение в пуле бота
+            bot = get_bot(dispatcher_workers=workers)
+            # Пошаговые сценарии переживают перезапуск бота
+            persistence = DatabasePersistence()
+            if options['async_mode']:
+                # Очередью и порядком обновлений управляет AsyncBotRuntime
+                dispatcher = Dispatcher(
+                    bot, Queue(), workers=1, persistence=persistence, use_context=True
+                )
+            else:
+                # Очередь ограничена: при переполнении поллинг ждёт,
+                # а вебхук просит Telegram повторить доставку позже
+                dispatcher = OrderedDispatcher(
+                    bot,
+                    Queue(maxsize=queue_size),
+                    workers=workers,
+                    persistence=persistence,
+                    use_context=True
+                )
 
             register_common_handlers(dispatcher)
+            persistence.start()
+            question_buffer.start()
+
+            if not options['no_outbox']:
+                outbox_worker = OutboxWorker()
+                outbox_worker.start()
+
+            if not options['no_reminders']:
+                reminder_scheduler = ReminderScheduler()
+                reminder_scheduler.start()
+
+            if not options['no_question_digest']:
+                question_digest = QuestionDigestWorker()
+                question_digest.start()
 
             logger.info("Бот запускается...")
             self.stdout.write(
                 self.style.SUCCESS("Бот запущен. Нажми Ctrl+C для остановки.")
             )
-            
-            updater.start_polling()
-            updater.idle()
-            
+
+            if options['webhook']:
+                self.run_webhook(dispatcher, options, deadline)
+            elif options['async_mode']:
+                AsyncBotRuntime(dispatcher, workers=workers, max_pending=queue_size, deadline=deadline).run()
+            else:
+                self.run_polling(dispatcher, deadline)
+
         except Exception as e:
             logger.error(f"Error starting bot: {e}")
             self.stdout.write(
                 self.style.ERROR(f"Ошибка при запуске бота: {e}")
             )
+        finally:
+            # Обновления уже не обрабатываются: сначала сохраняем то, что есть
+            # только в памяти, затем останавливаем рассылки, которые хранят
+            # состояние в базе и продолжат работу после перезапуска
+            question_buffer.stop(timeout=deadline.remaining())
+            try:
+                # Вопросы сохраняем даже после истечения срока, это один INSERT
+                question_buffer.flush()
+            except Exception as e:
+                logger.error(f"Failed to save buffered questions: {e}")
+            if persistence is not None:
+                persistence.stop(timeout=deadline.remaining())
+                if dispatcher is not None:
+                    dispatcher.update_persistence()
+                persistence.flush()
+            for worker in (question_digest, reminder_scheduler, outbox_worker):
+                if worker:
+                    worker.stop(timeout=deadline.remaining())
+            logger.info("Бот остановлен")
+
+    def run_polling(self, dispatcher, deadline):
+        # Updater запускает очередь задач диспетчера, без неё поллинг не стартует
+        job_queue = JobQueue()
+        job_queue.set_dispatcher(dispatcher)
+        dispatcher.job_queue = job_queue
+
+        updater = Updater(dispatcher=dispatcher, workers=None)
+        updater.start_polling()
+        try:
+            wait_for_stop_signal()
+        finally:
+            # Обновления, полученные после этого, Updater не берёт в работу
+            # и не подтверждает, Telegram пришлёт их после перезапуска
+            updater.running = False
+            drained = dispatcher.stop(timeout=deadline.remaining())
+            job_queue.stop()
+            # Выброшенные по сроку обновления не подтверждаем, их пришлют снова
+            if drained and updater.last_update_id:
+                confirm_updates(dispatcher.bot, updater.last_update_id)
+
+    def run_webhook(self, dispatcher, options, deadline):
+        server = WebhookServer(
+            dispatcher.bot,
+            dispatcher.update_queue,
+            host=options['host'],
+            port=options['port'],
+            path=options['webhook_path'],
+            secret_token=TELEGRAM_WEBHOOK_SECRET or None
+        )
+        dispatcher_thread = threading.Thread(target=dispatcher.start, name="dispatcher", daemon=True)
+        dispatcher_thread.start()
+        server.start()
+
+        if options['webhook_url']:
+            dispatcher.bot.set_webhook(
+                url=options['webhook_url'],
+                secret_token=TELEGRAM_WEBHOOK_SECRET or None
+            )
+
+        try:
+            wait_for_stop_signal()
+        finally:
+            # Сначала перестаём принимать обновления, затем дорабатываем очередь
+            server.stop()
+            dispatcher.stop(timeout=deadline.remaining())
+            dispatcher_thread.join(deadline.remaining())
@@ -0,0 +1,42 @@
+import logging
+from django.core.management.base import BaseCommand
+
+from tg_bot.notifications import get_notification_service
+from tg_bot.outbox import OutboxWorker, drain_outbox
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Send queued notifications from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь один раз и выйти',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=OutboxWorker.interval,
+            help='Интервал опроса очереди в секундах',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            get_notification_service().resume_interrupted()
+            processed = drain_outbox()
+            self.stdout.write(self.style.SUCCESS(f"Обработано уведомлений: {processed}"))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS("Обработчик очереди уведомлений запущен. Нажми Ctrl+C для остановки.")
+        )
+        worker = OutboxWorker(interval=options['interval'])
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.stop_event.set()
+            self.stdout.write("Обработчик очереди остановлен")
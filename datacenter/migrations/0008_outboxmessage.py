@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 18:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacenter', '0007_alter_notification_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('program_change', 'Изменение программы'), ('new_event', 'Новое мероприятие'), ('reminder', 'Напоминание'), ('general', 'Общее уведомление')], max_length=20)),
+                ('message', models.TextField(blank=True)),
+                ('speech_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='datacenter.event')),
+            ],
+            options={
+                'verbose_name': 'Уведомление в очереди',
+                'verbose_name_plural': 'Очередь уведомлений',
+                'ordering': ('id',),
+                'indexes': [models.Index(fields=['processed_at', 'id'], name='datacenter__process_c01211_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacenter', '0008_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='usernotification',
+            options={'verbose_name': 'Доставка уведомления', 'verbose_name_plural': 'Доставка уведомлений'},
+        ),
+        migrations.AddField(
+            model_name='usernotification',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Попыток'),
+        ),
+        migrations.AddField(
+            model_name='usernotification',
+            name='last_error',
+            field=models.TextField(blank=True, verbose_name='Последняя ошибка'),
+        ),
+        # Раньше записи создавались только для доставленных уведомлений
+        migrations.AddField(
+            model_name='usernotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Ошибка отправки'), ('dead', 'Не доставлено')], default='sent', max_length=10, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='usernotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Ошибка отправки'), ('dead', 'Не доставлено')], default='pending', max_length=10, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacenter', '0009_usernotification_delivery_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='is_reachable',
+            field=models.BooleanField(default=True, help_text='Снимается, если пользователь заблокировал бота или чат не найден', verbose_name='Доступен для рассылок'),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='unreachable_since',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Недоступен с'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacenter', '0010_participant_is_reachable'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usernotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает отправки'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Ошибка отправки'), ('dead', 'Не доставлено')], default='pending', max_length=10, verbose_name='Статус'),
+        ),
+        migrations.AddConstraint(
+            model_name='usernotification',
+            constraint=models.UniqueConstraint(fields=('notification', 'participant'), name='unique_user_notification'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def skip_existing_questions(apps, schema_editor):
+    # Уже заданные вопросы не рассылаем, дайджест начинается с новых
+    Question = apps.get_model('datacenter', 'Question')
+    Speaker = apps.get_model('datacenter', 'Speaker')
+    last_id = Question.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    Speaker.objects.update(last_pushed_question_id=last_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacenter', '0011_resumable_deliveries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='speaker',
+            name='last_pushed_question_id',
+            field=models.BigIntegerField(default=0, help_text='Вопросы с большим id ещё не ушли спикеру в дайджесте', verbose_name='Последний отправленный вопрос'),
+        ),
+        migrations.RunPython(skip_existing_questions, migrations.RunPython.noop),
+    ]
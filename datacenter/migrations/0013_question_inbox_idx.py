@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacenter', '0012_speaker_last_pushed_question_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['speech', 'is_answered', 'created_at', 'id'], name='question_inbox_idx'),
+        ),
+    ]
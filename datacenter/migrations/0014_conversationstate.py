@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacenter', '0013_question_inbox_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('user', 'Пользователь'), ('chat', 'Чат')], max_length=4)),
+                ('telegram_id', models.BigIntegerField()),
+                ('data', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Состояние диалога',
+                'verbose_name_plural': 'Состояния диалогов',
+                'constraints': [models.UniqueConstraint(fields=('scope', 'telegram_id'), name='unique_conversation_state')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacenter', '0014_conversationstate'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='question',
+            name='question_inbox_idx',
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('is_answered', False)), fields=['speech', 'created_at', 'id'], name='question_inbox_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+def link_reminders_to_speeches(apps, schema_editor):
+    # Старые напоминания о выступлениях узнаём по заголовку, больше он не нужен
+    Notification = apps.get_model('datacenter', 'Notification')
+    Speech = apps.get_model('datacenter', 'Speech')
+    for speech_id, event_id, title in Speech.objects.values_list('id', 'event_id', 'title'):
+        Notification.objects.filter(
+            notification_type='reminder',
+            event_id=event_id,
+            title=f"Напоминание: {title}",
+            speech_id__isnull=True
+        ).update(speech_id=speech_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacenter', '0015_question_inbox_partial_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='speech_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(link_reminders_to_speeches, migrations.RunPython.noop),
+    ]
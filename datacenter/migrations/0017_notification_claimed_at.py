@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacenter', '0016_notification_speech_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,5 @@
 import logging
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.dispatch import receiver
@@ -41,21 +41,32 @@ class Event(models.Model):
                 old_event.title != self.title or
                 old_event.date != self.date
             )
+            activity_changed = old_event.is_active != self.is_active
         else:
             important_fields_changed = True
+            activity_changed = False
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
-        try:
-            from tg_bot.notifications import get_notification_service
-            notification_service = get_notification_service()
             if is_new and self.is_active:
-                notification_service.send_new_event_notification(self)
+                OutboxMessage.objects.create(event=self, kind='new_event')
             elif not is_new and important_fields_changed and self.is_active:
                 change_description = f"Изменение в конференции '{self.title}'. Проверьте актуальное распмсаниею"
-                notification_service.send_program_change_notification(self, change_description)
-        except Exception as e:
-            logger.error(f'Failed to send program change notification: {e}')
+                OutboxMessage.objects.create(
+                    event=self,
+                    kind='program_change',
+                    message=change_description
+                )
+            elif activity_changed:
+                # Рассылки нет, запись сразу обработана: по ней планировщик
+                # напоминаний узнаёт, что мероприятие включили или выключили
+                OutboxMessage.objects.create(
+                    event=self,
+                    kind='general',
+                    message="Конференция опубликована" if self.is_active else "Конференция снята с публикации",
+                    processed_at=timezone.now()
+                )
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
@@ -64,6 +75,11 @@ class Event(models.Model):
 class Speaker(models.Model):
     name = models.CharField('Имя', max_length=255)
     telegram_id = models.BigIntegerField(null=True, blank=True)
+    last_pushed_question_id = models.BigIntegerField(
+        'Последний отправленный вопрос',
+        default=0,
+        help_text='Вопросы с большим id ещё не ушли спикеру в дайджесте'
+    )
 
     @property
     def speeches_count(self):
@@ -109,16 +125,20 @@ class Speech(models.Model):
         else:
             important_fields_changed = True
 
-        super().save(*args, **kwargs)
-
-        if important_fields_changed:
-            from tg_bot.notifications import get_notification_service
-            notification_service = get_notification_service()
-            if is_new:
-                change_description = f"Добавлено новое выступление '{self.title}'. Проверьте актуальное расписание."
-            else:
-                change_description = f"Изменения в выступлении '{self.title}'. Проверьте актуальное расписание."
-            notification_service.send_program_change_notification(self.event, change_description)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            if important_fields_changed:
+                if is_new:
+                    change_description = f"Добавлено новое выступление '{self.title}'. Проверьте актуальное расписание."
+                else:
+                    change_description = f"Изменения в выступлении '{self.title}'. Проверьте актуальное расписание."
+                OutboxMessage.objects.create(
+                    event=self.event,
+                    kind='program_change',
+                    message=change_description,
+                    speech_id=self.pk
+                )
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
@@ -132,6 +152,12 @@ class Participant(models.Model):
     position = models.CharField(max_length=255, blank=True)
     experience = models.CharField(max_length=100, blank=True)
     registered_at = models.DateTimeField(auto_now_add=True)
+    is_reachable = models.BooleanField(
+        'Доступен для рассылок',
+        default=True,
+        help_text="Снимается, если пользователь заблокировал бота или чат не найден"
+    )
+    unreachable_since = models.DateTimeField('Недоступен с', null=True, blank=True)
 
     looking_for = models.CharField(
         max_length=255,
@@ -167,6 +193,15 @@ class Question(models.Model):
 
     class Meta:
         ordering = ('speech',)
+        indexes = [
+            # Частичный индекс: в нём только неотвеченные вопросы, а фильтр
+            # is_answered=False и сортировка по (created_at, id) берутся из него
+            models.Index(
+                fields=['speech', 'created_at', 'id'],
+                condition=models.Q(is_answered=False),
+                name='question_inbox_idx'
+            )
+        ]
         verbose_name = 'Вопрос'
         verbose_name_plural = 'Вопросы'
 
@@ -219,6 +254,10 @@ class Notification(models.Model):
     is_sent = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     scheduled_for = models.DateTimeField(null=True, blank=True)
+    # Выступление, о котором напоминание; у напоминания о мероприятии пусто
+    speech_id = models.BigIntegerField(null=True, blank=True)
+    # Аренда рассылки: процесс, который её отправляет, продлевает это время
+    claimed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ('-created_at',)
@@ -230,11 +269,74 @@ class Notification(models.Model):
 
 
 class UserNotification(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sending', 'Отправляется'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Ошибка отправки'),
+        ('dead', 'Не доставлено'),
+    ]
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
     notification = models.ForeignKey(Notification, on_delete=models.CASCADE)
     is_read = models.BooleanField(default=False)
     received_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField('Статус', max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['notification', 'participant'],
+                name='unique_user_notification'
+            ),
+        ]
+        verbose_name = 'Доставка уведомления'
+        verbose_name_plural = 'Доставка уведомлений'
 
     def __str__(self):
         return f"Уведомлние для {self.participant} - {self.notification.title}"
-        
\ No newline at end of file
+
+
+class OutboxMessage(models.Model):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    message = models.TextField(blank=True)
+    speech_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ('id',)
+        indexes = [models.Index(fields=['processed_at', 'id'])]
+        verbose_name = 'Уведомление в очереди'
+        verbose_name_plural = 'Очередь уведомлений'
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.event.title}"
+
+
+class ConversationState(models.Model):
+    SCOPE_CHOICES = [
+        ('user', 'Пользователь'),
+        ('chat', 'Чат'),
+    ]
+    scope = models.CharField(max_length=4, choices=SCOPE_CHOICES)
+    telegram_id = models.BigIntegerField()
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'telegram_id'],
+                name='unique_conversation_state'
+            ),
+        ]
+        verbose_name = 'Состояние диалога'
+        verbose_name_plural = 'Состояния диалогов'
+
+    def __str__(self):
+        return f"{self.get_scope_display()} {self.telegram_id}"
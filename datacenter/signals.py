@@ -1,10 +1,58 @@
-from django.db.models.signals import pre_delete
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from .models import Speech
+from tg_bot.cache import (
+    invalidate_active_events, invalidate_schedule, invalidate_speaker_ids, invalidate_speech_timeline
+)
+from tg_bot.participants import participant_cache
+from .models import Event, OutboxMessage, Participant, Speaker, Speech
 
 @receiver(pre_delete, sender=Speech)
-def speech_pre_delete(sender, instance, **kwargs):
-    from tg_bot.notifications import get_notification_service
-    notification_service = get_notification_service()
+def speech_pre_delete(sender, instance, origin=None, **kwargs):
+    # Если удаляется всё мероприятие целиком, сообщать о каждом выступлении незачем
+    if isinstance(origin, Event):
+        return
     change_description = f"Выступление '{instance.title}' было удалено из программы."
-    notification_service.send_program_change_notification(instance.event, change_description)
+    OutboxMessage.objects.create(
+        event=instance.event,
+        kind='program_change',
+        message=change_description,
+        speech_id=instance.pk
+    )
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Speech)
+@receiver(post_delete, sender=Speech)
+@receiver(post_save, sender=Speaker)
+@receiver(post_delete, sender=Speaker)
+def program_changed(sender, **kwargs):
+    # Сбрасываем после коммита, иначе бот может успеть закэшировать старые данные
+    transaction.on_commit(invalidate_schedule)
+
+
+@receiver(post_save, sender=Speech)
+@receiver(post_delete, sender=Speech)
+@receiver(post_save, sender=Speaker)
+@receiver(post_delete, sender=Speaker)
+def speech_timeline_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_speech_timeline)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def active_events_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_active_events)
+
+
+@receiver(post_save, sender=Speaker)
+@receiver(post_delete, sender=Speaker)
+def speakers_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_speaker_ids)
+
+
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+def participant_changed(sender, instance, **kwargs):
+    participant_cache.invalidate(instance.telegram_id)
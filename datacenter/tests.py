@@ -1,3 +1,39 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from tg_bot.broadcast import TokenBucket
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_concurrent_pauses_do_not_add_up(self):
+        now = [0.0]
+        slept = []
+
+        def sleep(seconds):
+            slept.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(30, clock=lambda: now[0], sleep=sleep)
+        start = threading.Barrier(8)
+
+        def pause():
+            start.wait()
+            bucket.pause(5)
+
+        threads = [threading.Thread(target=pause) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(bucket.tokens, -5 * 30)
+        bucket.acquire()
+        self.assertAlmostEqual(sum(slept), 5 + 1 / 30)
+
+    def test_shorter_pause_keeps_longer_one(self):
+        now = [0.0]
+        bucket = TokenBucket(30, clock=lambda: now[0])
+        bucket.pause(5)
+        bucket.pause(1)
+        self.assertEqual(bucket.tokens, -5 * 30)
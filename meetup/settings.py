@@ -50,6 +50,31 @@ TEMPLATES = [
 NOTIFICATION_SETTINGS = {
     "reminder_minutes_before": 15,
     "max_reties": 3,
+    "broadcast_workers": 8,
+    "broadcast_rate_per_second": 30,
+    "broadcast_chat_interval": 1.0,
+    "delivery_flush_size": 200,
+    "delivery_lease_seconds": 300,
+    "retry_base_delay": 1.0,
+    "retry_max_delay": 30.0,
+    "program_change_coalesce_seconds": 60,
+    "program_change_max_delay_seconds": 300,
+}
+
+BOT_SETTINGS = {
+    "dispatcher_workers": 4,
+    "update_queue_size": 1000,
+    "question_flush_interval": 0.5,
+    "question_flush_batch": 50,
+    "question_digest_interval": 5.0,
+    "participant_cache_size": 10000,
+    "participant_cache_ttl": 300,
+    # Состояние диалогов пишется в базу раз в interval секунд,
+    # неактивные дольше idle_ttl секунд пользователи выгружаются из памяти
+    "conversation_flush_interval": 1.0,
+    "conversation_idle_ttl": 1800,
+    # Сколько секунд после SIGTERM бот дорабатывает очередь и сохраняет буферы
+    "shutdown_timeout": 25,
 }
 
 WSGI_APPLICATION = "meetup.wsgi.application"
@@ -58,6 +83,20 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Бот пишет в базу из нескольких потоков: ждём освобождения блокировки,
+        # а транзакции сразу берут блокировку на запись, чтобы не падать на её повышении
+        "OPTIONS": {
+            "timeout": 20,
+            "transaction_mode": "IMMEDIATE",
+        },
+    }
+}
+
+# Файловый кэш, чтобы бот видел сброс кэша при правках в админке
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache",
     }
 }
 
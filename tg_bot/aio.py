@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from telegram.error import NetworkError, RetryAfter, TimedOut
+
+from tg_bot.dispatcher import update_order_key
+from tg_bot.shutdown import Deadline, confirm_updates
+
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 30
+MAX_POLL_BACKOFF = 30
+
+
+class AsyncBotRuntime:
+    """Получает обновления и раздаёт их обработчикам из одного цикла asyncio.
+
+    Ожидающий чат — это корутина, а не поток, поэтому число одновременно
+    обслуживаемых чатов ограничено только max_pending. Сами обработчики
+    синхронные (ORM и Bot из python-telegram-bot 13), они выполняются в
+    пуле из workers потоков, и в любой момент занято не больше workers
+    соединений с базой. Обновления одного чата обрабатываются по порядку.
+    """
+
+    def __init__(self, dispatcher, workers=4, max_pending=1000, deadline=None):
+        self.dispatcher = dispatcher
+        self.deadline = deadline or Deadline()
+        self.bot = dispatcher.bot
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="async-handler")
+        # Поллинг держит поток на время long polling, поэтому у него свой
+        self.poll_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="async-poll")
+        self.chat_tails = {}
+        self.tasks = set()
+        # id следующего обновления, которое ещё не взято в работу
+        self.offset = None
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        self.slots = asyncio.Semaphore(self.max_pending)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stop_event.set)
+
+        try:
+            await loop.run_in_executor(self.poll_executor, self.bot.delete_webhook)
+            await self.poll()
+        finally:
+            # Выброшенные по сроку обновления не подтверждаем, их пришлют снова
+            if await self.drain() and self.offset is not None:
+                confirm_updates(self.bot, self.offset)
+
+    async def drain(self):
+        # Новые обновления уже не забираются, дорабатываем полученные до срока.
+        # True, если обработаны все
+        pending = set()
+        if self.tasks:
+            logger.info(f"Waiting for {len(self.tasks)} updates to finish")
+            _, pending = await asyncio.wait(set(self.tasks), timeout=self.deadline.remaining())
+        if pending:
+            logger.warning(f"Shutdown deadline exceeded, {len(pending)} updates were not processed")
+            for task in pending:
+                task.cancel()
+        self.executor.shutdown(wait=not pending, cancel_futures=True)
+        self.poll_executor.shutdown(wait=False, cancel_futures=True)
+        return not pending
+
+    async def poll(self):
+        loop = asyncio.get_running_loop()
+        backoff = 1
+        while not self.stop_event.is_set():
+            get_updates = loop.run_in_executor(
+                self.poll_executor,
+                lambda: self.bot.get_updates(offset=self.offset, timeout=POLL_TIMEOUT, read_latency=5)
+            )
+            stop = asyncio.ensure_future(self.stop_event.wait())
+            done, _ = await asyncio.wait({get_updates, stop}, return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+            if get_updates not in done:
+                break
+
+            try:
+                updates = get_updates.result()
+                backoff = 1
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except (TimedOut, NetworkError) as e:
+                logger.warning(f"Polling failed, retrying in {backoff}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_POLL_BACKOFF)
+                continue
+
+            for update in updates:
+                # Когда все слоты заняты, новые обновления не забираем
+                await self.slots.acquire()
+                self.schedule(update)
+                self.offset = update.update_id + 1
+
+    def schedule(self, update):
+        key = update_order_key(update)
+        previous = self.chat_tails.get(key)
+        task = asyncio.ensure_future(self.handle(update, previous))
+        self.chat_tails[key] = task
+        self.tasks.add(task)
+        task.add_done_callback(lambda finished: self._forget(key, finished))
+
+    def _forget(self, key, task):
+        self.tasks.discard(task)
+        self.slots.release()
+        if self.chat_tails.get(key) is task:
+            del self.chat_tails[key]
+
+    async def handle(self, update, previous):
+        if previous is not None:
+            await asyncio.wait({previous})
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self.process_update, update)
+        except Exception:
+            logger.exception(f"Error while processing update {update.update_id}")
+
+    def process_update(self, update):
+        close_old_connections()
+        try:
+            self.dispatcher.process_update(update)
+        finally:
+            close_old_connections()
@@ -0,0 +1,219 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from telegram.error import BadRequest, ChatMigrated, InvalidToken, NetworkError, RetryAfter, Unauthorized
+
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: около 30 сообщений в секунду на бота и не чаще
+# одного сообщения в секунду в один чат.
+DEFAULT_WORKERS = 8
+DEFAULT_RATE_PER_SECOND = 30
+DEFAULT_CHAT_INTERVAL = 1.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 30.0
+
+# Ошибки, после которых повторять отправку бессмысленно.
+# BadRequest и TimedOut наследуются от NetworkError, поэтому порядок проверок важен.
+PERMANENT_ERRORS = (BadRequest, Unauthorized, ChatMigrated, InvalidToken)
+TRANSIENT_ERRORS = (RetryAfter, NetworkError)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def pause(self, seconds):
+        """Забирает все токены на время RetryAfter, чтобы притормозить остальные потоки.
+
+        Один и тот же RetryAfter обычно приходит сразу нескольким потокам,
+        поэтому паузы не складываются: берётся самая длинная.
+        """
+        with self.lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+            self.updated_at = self.clock()
+
+
+class ChatRateLimiter:
+    def __init__(self, interval, clock=time.monotonic, sleep=time.sleep):
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.next_allowed = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, chat_id):
+        with self.lock:
+            now = self.clock()
+            allowed_at = max(now, self.next_allowed.get(chat_id, now))
+            self.next_allowed[chat_id] = allowed_at + self.interval
+            # Чистим устаревшие записи, чтобы словарь не рос бесконечно
+            if len(self.next_allowed) > 10000:
+                self.next_allowed = {
+                    key: value for key, value in self.next_allowed.items() if value > now
+                }
+        wait = allowed_at - now
+        if wait > 0:
+            self.sleep(wait)
+
+
+class DeliveryOutcome:
+    SENT = 'sent'
+    FAILED = 'failed'
+    DEAD = 'dead'
+
+    def __init__(self, participant, status, attempts, error=None):
+        self.participant = participant
+        self.status = status
+        self.attempts = attempts
+        self.error = error
+
+    @property
+    def delivered(self):
+        return self.status == self.SENT
+
+    @property
+    def unreachable(self):
+        return self.error is not None and is_unreachable_error(self.error)
+
+
+class DeliveryError(Exception):
+    def __init__(self, error, attempts, permanent):
+        super().__init__(str(error))
+        self.error = error
+        self.attempts = attempts
+        self.permanent = permanent
+
+
+class BroadcastResult:
+    def __init__(self):
+        self.delivered = []
+        self.failed = []
+
+    @property
+    def delivered_count(self):
+        return len(self.delivered)
+
+    @property
+    def failed_count(self):
+        return len(self.failed)
+
+    def __repr__(self):
+        return f"BroadcastResult(delivered={self.delivered_count}, failed={self.failed_count})"
+
+
+def is_unreachable_error(error):
+    """Пользователь заблокировал бота, удалил аккаунт или чат не существует."""
+    if isinstance(error, Unauthorized):
+        return True
+    return isinstance(error, BadRequest) and 'chat not found' in str(error).lower()
+
+
+def is_permanent_error(error):
+    if isinstance(error, PERMANENT_ERRORS):
+        return True
+    return not isinstance(error, TRANSIENT_ERRORS)
+
+
+class Broadcaster:
+    """Рассылает одно сообщение списку участников через пул потоков.
+
+    Отправка идёт из рабочих потоков, а колбэки и запись результата
+    выполняются в вызывающем потоке, поэтому обращения к БД остаются там же.
+    Временные ошибки (сеть, 5xx, RetryAfter) повторяются с экспоненциальной
+    задержкой и джиттером до max_reties раз, постоянные сразу уходят в dead.
+    """
+
+    def __init__(self, bot, workers=None, rate_per_second=None, chat_interval=None,
+                 max_retries=None, sleep=time.sleep):
+        notification_settings = getattr(settings, "NOTIFICATION_SETTINGS", {})
+        self.bot = bot
+        self.sleep = sleep
+        self.workers = workers or notification_settings.get("broadcast_workers", DEFAULT_WORKERS)
+        self.bucket = TokenBucket(
+            rate_per_second or notification_settings.get("broadcast_rate_per_second", DEFAULT_RATE_PER_SECOND)
+        )
+        self.chat_limiter = ChatRateLimiter(
+            chat_interval or notification_settings.get("broadcast_chat_interval", DEFAULT_CHAT_INTERVAL)
+        )
+        if max_retries is None:
+            max_retries = notification_settings.get("max_reties", DEFAULT_MAX_RETRIES)
+        self.max_retries = max_retries
+        self.retry_base_delay = notification_settings.get("retry_base_delay", DEFAULT_RETRY_BASE_DELAY)
+        self.retry_max_delay = notification_settings.get("retry_max_delay", DEFAULT_RETRY_MAX_DELAY)
+
+    def send(self, participants, text, parse_mode=None, on_result=None):
+        result = BroadcastResult()
+        participants = list(participants)
+        if not participants:
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="broadcast") as executor:
+            futures = {
+                executor.submit(self._deliver, participant.telegram_id, text, parse_mode): participant
+                for participant in participants
+            }
+            for future in as_completed(futures):
+                participant = futures[future]
+                try:
+                    outcome = DeliveryOutcome(participant, DeliveryOutcome.SENT, future.result())
+                    result.delivered.append(participant)
+                except DeliveryError as e:
+                    status = DeliveryOutcome.DEAD if e.permanent else DeliveryOutcome.FAILED
+                    outcome = DeliveryOutcome(participant, status, e.attempts, e.error)
+                    result.failed.append(participant)
+                    logger.error(f"Failed to send notification to {participant.telegram_id}: {e}")
+                if on_result:
+                    on_result(outcome)
+
+        return result
+
+    def backoff_delay(self, attempt):
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def _deliver(self, chat_id, text, parse_mode):
+        attempt = 0
+        while True:
+            attempt += 1
+            self.chat_limiter.acquire(chat_id)
+            self.bucket.acquire()
+            try:
+                self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                return attempt
+            except Exception as e:
+                permanent = is_permanent_error(e)
+                if permanent or attempt > self.max_retries:
+                    raise DeliveryError(e, attempt, permanent)
+
+                if isinstance(e, RetryAfter):
+                    delay = e.retry_after
+                    self.bucket.pause(delay)
+                else:
+                    delay = self.backoff_delay(attempt)
+                logger.warning(f"Retrying message to {chat_id} in {delay:.1f}s after error: {e}")
+                self.sleep(delay)
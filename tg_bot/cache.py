@@ -0,0 +1,69 @@
+import threading
+import uuid
+from django.core.cache import cache
+
+
+# Кэш общий для процессов бота и админки (см. CACHES в settings),
+# поэтому изменения, сделанные в админке, сбрасывают кэш и в боте.
+SCHEDULE_CACHE_KEY = "tg_bot:schedule"
+SCHEDULE_CACHE_MAX_SECONDS = 300
+
+SPEECH_TIMELINE_VERSION_KEY = "tg_bot:speech_timeline:version"
+SPEAKER_IDS_VERSION_KEY = "tg_bot:speaker_ids:version"
+ACTIVE_EVENTS_VERSION_KEY = "tg_bot:active_events:version"
+
+
+def invalidate_schedule():
+    cache.delete(SCHEDULE_CACHE_KEY)
+
+
+def bump_version(version_key):
+    cache.set(version_key, uuid.uuid4().hex, None)
+
+
+class LocalCache:
+    """Значение в памяти процесса, которое перезагружается при смене версии.
+
+    Сама версия лежит в общем кэше, так что проверка актуальности стоит
+    одного чтения из кэша и не обращается к базе.
+    """
+
+    def __init__(self, version_key, loader):
+        self.version_key = version_key
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.version = None
+        self.value = None
+
+    def get(self):
+        version = cache.get(self.version_key)
+        with self.lock:
+            if self.loaded and self.version == version:
+                return self.value
+            # Версию берём до загрузки: если данные поменяются во время
+            # загрузки, следующий вызов увидит новую версию и перезагрузит их
+            self.value = self.loader()
+            self.version = version
+            self.loaded = True
+            return self.value
+
+    def reload(self):
+        with self.lock:
+            self.loaded = False
+        return self.get()
+
+    def invalidate(self):
+        bump_version(self.version_key)
+
+
+def invalidate_speech_timeline():
+    bump_version(SPEECH_TIMELINE_VERSION_KEY)
+
+
+def invalidate_speaker_ids():
+    bump_version(SPEAKER_IDS_VERSION_KEY)
+
+
+def invalidate_active_events():
+    bump_version(ACTIVE_EVENTS_VERSION_KEY)
@@ -11,36 +11,62 @@ from tg_bot.talks import (
 from tg_bot.networking import (
     start_networking, handle_networking_message_if_active
 )
+from tg_bot.question_inbox import INBOX_CALLBACK_PREFIX, handle_inbox_callback
 from tg_bot.donations import start_donation, handle_donation_message_if_active
-from datacenter.models import Speaker
+from datacenter.models import Participant, Speaker
+from tg_bot.cache import SPEAKER_IDS_VERSION_KEY, LocalCache
+
+
+def _load_speaker_ids():
+    return frozenset(
+        Speaker.objects.filter(telegram_id__isnull=False).values_list("telegram_id", flat=True)
+    )
+
+
+# Telegram id всех спикеров; сбрасывается сигналами Speaker через общий кэш
+speaker_ids = LocalCache(SPEAKER_IDS_VERSION_KEY, _load_speaker_ids)
 
 
 def is_speaker(telegram_id: int) -> bool:
     try:
-        return Speaker.objects.filter(telegram_id=telegram_id).exists()
+        return telegram_id in speaker_ids.get()
     except Exception:
         return False
 
 
-def get_main_menu_keyboard(telegram_id: int = None) -> ReplyKeyboardMarkup:
-    if telegram_id and is_speaker(telegram_id):
-        keyboard = [
-            [KeyboardButton("Вопрос спикеру"), KeyboardButton("Программа")],
-            [KeyboardButton("Нетворкинг"), KeyboardButton("Мои вопросы")],
-            [KeyboardButton("Поддержать митап")],
-        ]  
-    else:
-        keyboard = [
-            [KeyboardButton("Вопрос спикеру"), KeyboardButton("Программа")],
-            [KeyboardButton("Нетворкинг"), KeyboardButton("Поддержать митап")],
-        ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+SPEAKER_MENU_KEYBOARD = ReplyKeyboardMarkup(
+    [
+        [KeyboardButton("Вопрос спикеру"), KeyboardButton("Программа")],
+        [KeyboardButton("Нетворкинг"), KeyboardButton("Мои вопросы")],
+        [KeyboardButton("Поддержать митап")],
+    ],
+    resize_keyboard=True
+)
+PARTICIPANT_MENU_KEYBOARD = ReplyKeyboardMarkup(
+    [
+        [KeyboardButton("Вопрос спикеру"), KeyboardButton("Программа")],
+        [KeyboardButton("Нетворкинг"), KeyboardButton("Поддержать митап")],
+    ],
+    resize_keyboard=True
+)
+
+
+def get_main_menu_keyboard(telegram_id: int = None, speaker: bool = None) -> ReplyKeyboardMarkup:
+    if speaker is None:
+        speaker = bool(telegram_id) and is_speaker(telegram_id)
+    return SPEAKER_MENU_KEYBOARD if speaker else PARTICIPANT_MENU_KEYBOARD
 
 
 def start(update: Update, context: CallbackContext):
     user = update.effective_user
-    keyboard = get_main_menu_keyboard(user.id)
-    if is_speaker(user.id):
+    # Пользователь снова написал боту, значит его можно вернуть в рассылки
+    Participant.objects.filter(telegram_id=user.id, is_reachable=False).update(
+        is_reachable=True,
+        unreachable_since=None
+    )
+    speaker = is_speaker(user.id)
+    keyboard = get_main_menu_keyboard(speaker=speaker)
+    if speaker:
         text = (
             "Привет, {name}!\n\n"
             "Я бот PythonMeetup.\n\n"
@@ -120,6 +146,8 @@ def update_menu(update: Update, context: CallbackContext):
     start(update, context)
 
 def register_common_handlers(dispatcher):
+    speaker_ids.reload()
+
     dispatcher.add_handler(CommandHandler("start", start))
     dispatcher.add_handler(CommandHandler("help", help_command))
     dispatcher.add_handler(CommandHandler("update", update_menu))
@@ -134,6 +162,11 @@ def register_common_handlers(dispatcher):
             handle_settings_callback, pattern='^(toggle_|info_)'
         )
     )
+    dispatcher.add_handler(
+        CallbackQueryHandler(
+            handle_inbox_callback, pattern=f'^{INBOX_CALLBACK_PREFIX}:'
+        )
+    )
     
     dispatcher.add_handler(
         MessageHandler(Filters.text & ~Filters.command, menu_router)
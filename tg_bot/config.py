@@ -5,3 +5,6 @@ env = Env()
 env.read_env()
 
 TELEGRAM_BOT_TOKEN = env.str('TG_TOKEN')
+TELEGRAM_WEBHOOK_SECRET = env.str('TG_WEBHOOK_SECRET', '')
+# Адрес Bot API; можно подменить локальной заглушкой для проверки бота
+TELEGRAM_API_URL = env.str('TG_API_URL', None)
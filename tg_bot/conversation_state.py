@@ -0,0 +1,252 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from telegram.ext import BasePersistence
+
+from datacenter.models import ConversationState
+from tg_bot.workers import PeriodicWorker
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_IDLE_TTL = 1800
+WRITE_BATCH_SIZE = 500
+EMPTY_SNAPSHOT = "{}"
+
+
+def _snapshot(data):
+    return json.dumps(data, ensure_ascii=False, sort_keys=True)
+
+
+class ConversationData(defaultdict):
+    """user_data или chat_data, которые подгружают состояние из базы при первом обращении.
+
+    Запоминает время последнего обращения к каждому ключу, чтобы
+    DatabasePersistence могла выгружать из памяти давно молчащих
+    пользователей.
+    """
+
+    def __init__(self, loader, clock=time.monotonic):
+        super().__init__(dict)
+        self.loader = loader
+        self.clock = clock
+        self.last_access = {}
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self.lock:
+            self.last_access[key] = self.clock()
+            if key in self:
+                return dict.__getitem__(self, key)
+        # Загружаем вне блокировки, чтобы не задерживать другие чаты
+        value = self.loader(key)
+        with self.lock:
+            self.last_access[key] = self.clock()
+            return self.setdefault(key, value)
+
+    def evict_idle(self, idle_since):
+        """Выгружает ключи, к которым не обращались с idle_since, и возвращает их."""
+        with self.lock:
+            evicted = [key for key, accessed in self.last_access.items() if accessed <= idle_since]
+            for key in evicted:
+                del self.last_access[key]
+                self.pop(key, None)
+        return evicted
+
+
+class DatabasePersistence(BasePersistence):
+    """Хранит context.user_data и context.chat_data в таблице ConversationState.
+
+    Состояние пользователя загружается из базы при первом его обновлении
+    после запуска. После каждого обновления снимок данных в JSON
+    сравнивается с сохранённым, и изменившиеся снимки раз в
+    conversation_flush_interval секунд пишутся в базу одним запросом.
+    Пользователи, от которых не было обновлений conversation_idle_ttl
+    секунд, выгружаются из памяти, поэтому память зависит от числа
+    активных пользователей, а не от всех, кто когда-либо заходил в бота.
+    """
+
+    def __init__(self, interval=None, idle_ttl=None, clock=time.monotonic):
+        super().__init__(store_user_data=True, store_chat_data=True, store_bot_data=False)
+        bot_settings = getattr(settings, "BOT_SETTINGS", {})
+        self.idle_ttl = idle_ttl or bot_settings.get("conversation_idle_ttl", DEFAULT_IDLE_TTL)
+        self.clock = clock
+        self.user_data = ConversationData(partial(self._load, "user"), clock)
+        self.chat_data = ConversationData(partial(self._load, "chat"), clock)
+        # Снимки, которые уже лежат в базе, ждут записи и пишутся прямо сейчас
+        self.saved = {}
+        self.pending = {}
+        self.writing = {}
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.writer = ConversationStateWriter(
+            self, interval or bot_settings.get("conversation_flush_interval", DEFAULT_FLUSH_INTERVAL)
+        )
+
+    # В состоянии диалогов только JSON, объектов Bot там нет,
+    # поэтому копировать данные при каждом обновлении не нужно
+    def insert_bot(self, obj):
+        return obj
+
+    def replace_bot(self, obj):
+        return obj
+
+    def start(self):
+        self.writer.start()
+
+    def stop(self, timeout=None):
+        self.writer.stop(timeout)
+
+    def get_user_data(self):
+        return self.user_data
+
+    def get_chat_data(self):
+        return self.chat_data
+
+    def get_bot_data(self):
+        return {}
+
+    def get_callback_data(self):
+        return None
+
+    def get_conversations(self, name):
+        return {}
+
+    def update_user_data(self, user_id, data):
+        self._update("user", user_id, data)
+
+    def update_chat_data(self, chat_id, data):
+        self._update("chat", chat_id, data)
+
+    def update_bot_data(self, data):
+        pass
+
+    def update_callback_data(self, data):
+        pass
+
+    def update_conversation(self, name, key, new_state):
+        pass
+
+    def refresh_user_data(self, user_id, user_data):
+        pass
+
+    def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    def refresh_bot_data(self, bot_data):
+        pass
+
+    def flush(self):
+        try:
+            self.write_pending()
+        except Exception as e:
+            logger.error(f"Failed to save conversation state: {e}")
+
+    def _load(self, scope, telegram_id):
+        key = (scope, telegram_id)
+        with self.lock:
+            snapshot = self.pending.get(key) or self.writing.get(key)
+        if snapshot is not None:
+            return json.loads(snapshot)
+
+        data = ConversationState.objects.filter(
+            scope=scope, telegram_id=telegram_id
+        ).values_list("data", flat=True).first() or {}
+        with self.lock:
+            self.saved[key] = _snapshot(data)
+        return data
+
+    def _update(self, scope, telegram_id, data):
+        try:
+            snapshot = _snapshot(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Conversation state of {scope} {telegram_id} is not JSON serializable: {e}")
+            return
+
+        key = (scope, telegram_id)
+        with self.lock:
+            if self.pending.get(key, self.saved.get(key, EMPTY_SNAPSHOT)) != snapshot:
+                self.pending[key] = snapshot
+
+    def write_pending(self):
+        """Пишет изменившиеся состояния в базу и возвращает их количество."""
+        with self.write_lock:
+            with self.lock:
+                self.writing, self.pending = self.pending, {}
+            if not self.writing:
+                return 0
+
+            now = timezone.now()
+            changed = []
+            emptied = defaultdict(list)
+            for (scope, telegram_id), snapshot in self.writing.items():
+                if snapshot == EMPTY_SNAPSHOT:
+                    emptied[scope].append(telegram_id)
+                else:
+                    changed.append(ConversationState(
+                        scope=scope, telegram_id=telegram_id, data=json.loads(snapshot), updated_at=now
+                    ))
+
+            try:
+                with transaction.atomic():
+                    ConversationState.objects.bulk_create(
+                        changed,
+                        batch_size=WRITE_BATCH_SIZE,
+                        update_conflicts=True,
+                        unique_fields=["scope", "telegram_id"],
+                        update_fields=["data", "updated_at"],
+                    )
+                    # Завершённые сценарии не храним
+                    for scope, telegram_ids in emptied.items():
+                        ConversationState.objects.filter(scope=scope, telegram_id__in=telegram_ids).delete()
+            except Exception:
+                # Более свежие снимки, пришедшие во время записи, важнее
+                with self.lock:
+                    for key, snapshot in self.writing.items():
+                        self.pending.setdefault(key, snapshot)
+                    self.writing = {}
+                raise
+
+            with self.lock:
+                written, self.writing = self.writing, {}
+                for (scope, telegram_id), snapshot in written.items():
+                    if telegram_id in self._data(scope):
+                        self.saved[(scope, telegram_id)] = snapshot
+            return len(written)
+
+    def evict_idle(self):
+        """Выгружает из памяти состояние пользователей и чатов, давно не присылавших обновлений."""
+        idle_since = self.clock() - self.idle_ttl
+        evicted = 0
+        for scope in ("user", "chat"):
+            keys = self._data(scope).evict_idle(idle_since)
+            with self.lock:
+                for telegram_id in keys:
+                    self.saved.pop((scope, telegram_id), None)
+            evicted += len(keys)
+        return evicted
+
+    def _data(self, scope):
+        return self.user_data if scope == "user" else self.chat_data
+
+
+class ConversationStateWriter(PeriodicWorker):
+    """Периодически сохраняет состояние диалогов и выгружает неактивных пользователей."""
+
+    def __init__(self, persistence, interval):
+        super().__init__(interval)
+        self.persistence = persistence
+
+    def run_once(self):
+        self.persistence.write_pending()
+        self.persistence.evict_idle()
+
+    def on_stop(self):
+        self.persistence.write_pending()
@@ -0,0 +1,106 @@
+import logging
+import threading
+from queue import Queue
+
+from django.db import close_old_connections, connection
+from telegram import Update
+from telegram.ext import Dispatcher
+
+from tg_bot.shutdown import Deadline, discard_queue, join_queue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKER_QUEUE_SIZE = 100
+
+_STOP = object()
+
+
+def update_order_key(update):
+    """Ключ, внутри которого обновления обрабатываются строго по порядку."""
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return update.update_id
+
+
+class OrderedDispatcher(Dispatcher):
+    """Диспетчер, который обрабатывает обновления в пуле из workers потоков.
+
+    Обновления одного чата всегда попадают в один и тот же поток, поэтому
+    идут по порядку, и пошаговые сценарии в context.user_data (анкета
+    нетворкинга, ввод вопроса, донат) не ломаются. Разные чаты
+    обрабатываются параллельно.
+
+    Очереди потоков ограничены: если поток занят, диспетчер ждёт, общая
+    очередь обновлений заполняется и срабатывает её ограничение.
+    Соединения с базой закрываются между обновлениями так же, как Django
+    делает это между HTTP-запросами.
+    """
+
+    def __init__(self, bot, update_queue, workers=4, worker_queue_size=DEFAULT_WORKER_QUEUE_SIZE, **kwargs):
+        # Пул run_async почти не нужен, обработчики и так выполняются в пуле
+        super().__init__(bot, update_queue, workers=1, **kwargs)
+        self.worker_queues = [Queue(maxsize=worker_queue_size) for _ in range(workers)]
+        self.worker_threads = []
+
+    def start(self, ready=None):
+        if not self.worker_threads:
+            for index, worker_queue in enumerate(self.worker_queues):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(worker_queue,),
+                    name=f"{self.__class__.__name__}-{index}",
+                    daemon=True
+                )
+                thread.start()
+                self.worker_threads.append(thread)
+        super().start(ready)
+
+    def process_update(self, update):
+        # Ошибки поллинга и прочие объекты не из Telegram обрабатываем сразу
+        if not isinstance(update, Update):
+            super().process_update(update)
+            return
+        worker_queue = self.worker_queues[update_order_key(update) % len(self.worker_queues)]
+        worker_queue.put(update)
+
+    def _work(self, worker_queue):
+        while True:
+            update = worker_queue.get()
+            if update is _STOP:
+                worker_queue.task_done()
+                break
+            close_old_connections()
+            try:
+                super().process_update(update)
+            except Exception:
+                logger.exception(f"Error while processing update {update.update_id}")
+            finally:
+                close_old_connections()
+                worker_queue.task_done()
+        connection.close()
+
+    def stop(self, timeout=None):
+        """Дорабатывает очереди обновлений не дольше timeout секунд и останавливает потоки.
+
+        Обновления, которые не успели обработать за это время, выбрасываются.
+        Возвращает True, если обработаны все обновления.
+        """
+        deadline = Deadline(timeout)
+        drained = join_queue(self.update_queue, deadline) and all(
+            join_queue(worker_queue, deadline) for worker_queue in self.worker_queues
+        )
+        if not drained:
+            discarded = discard_queue(self.update_queue) + sum(
+                discard_queue(worker_queue) for worker_queue in self.worker_queues
+            )
+            logger.warning(f"Shutdown deadline exceeded, {discarded} updates were not processed")
+
+        super().stop()
+        for worker_queue in self.worker_queues:
+            worker_queue.put(_STOP)
+        for thread in self.worker_threads:
+            thread.join(deadline.remaining())
+        self.worker_threads = []
+        return drained
@@ -1,7 +1,8 @@
 from telegram import Update
 from telegram.ext import CallbackContext
 from django.utils import timezone
-from datacenter.models import Participant, Donation
+from datacenter.models import Donation
+from .participants import participant_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -65,27 +66,7 @@ def handle_donation_message_if_active(update: Update, context: CallbackContext)
     user = update.effective_user
 
     try:
-        participant, created = Participant.objects.get_or_create(
-            telegram_id=user.id,
-            defaults={
-                "username": user.username,
-                "full_name": f"{user.first_name} {user.last_name or ''}".strip()
-            }
-        )
-        
-        if not created:
-            update_fields = {}
-            if user.username and user.username != participant.username:
-                participant.username = user.username
-                update_fields['username'] = user.username
-            
-            full_name = f"{user.first_name} {user.last_name or ''}".strip()
-            if full_name and full_name != participant.full_name:
-                participant.full_name = full_name
-                update_fields['full_name'] = full_name
-            
-            if update_fields:
-                participant.save(update_fields=update_fields)
+        participant = participant_cache.get_or_create(user)
         
         donation = Donation.objects.create(
             participant=participant,
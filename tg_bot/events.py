@@ -0,0 +1,34 @@
+from datetime import datetime, time
+from django.utils import timezone
+
+from datacenter.models import Event
+from .cache import ACTIVE_EVENTS_VERSION_KEY, LocalCache
+
+
+def _load_active_events():
+    return list(Event.objects.filter(is_active=True).order_by("date", "pk"))
+
+
+_active_events_cache = LocalCache(ACTIVE_EVENTS_VERSION_KEY, _load_active_events)
+
+
+def get_active_events():
+    return _active_events_cache.get()
+
+
+def get_current_event(now=None):
+    """Текущее активное мероприятие: ближайшее, которое проходит сегодня или позже.
+
+    Если все активные мероприятия уже прошли, берётся самое позднее из них.
+    При равных датах выигрывает созданное раньше, так что выбор не зависит
+    от сортировки модели по названию.
+    """
+    events = get_active_events()
+    if not events:
+        return None
+
+    day_start = timezone.make_aware(datetime.combine(timezone.localdate(now), time.min))
+    for event in events:
+        if event.date >= day_start:
+            return event
+    return events[-1]
@@ -1,6 +1,7 @@
 from telegram import Update
 from telegram.ext import CallbackContext
 from datacenter.models import Participant
+from .participants import participant_cache
 
 PROFILE_QUESTIONS = [
     (
@@ -116,10 +117,7 @@ def _finish_profile(update: Update, context: CallbackContext) -> None:
     user = update.effective_user
 
     # TODO: здесь должен быть вызов Django API, что-то вроде:
-    participant, _ = Participant.objects.get_or_create(
-        telegram_id=user.id,
-        defaults={'username': user.username}
-    )
+    participant = participant_cache.get_or_create(user)
     participant.position = form.get('role', '')
     participant.experience = form.get('experience', '')
     participant.looking_for = form.get('looking_for', '')
@@ -238,7 +236,8 @@ def _fetch_next_candidate_stub(user_telegram_id: int, context: CallbackContext):
     Возвращает следующего кандидата из DUMMY_CANDIDATES, которого пользователь ещё не видел.
     Эта функция должна дергать Django API.
     """
-    seen_ids = context.user_data.get("networking_seen_ids", set())
+    # Список, а не множество: состояние диалога хранится в базе в JSON
+    seen_ids = context.user_data.get("networking_seen_ids", [])
 
     candidate = Participant.objects.filter(
         # Ищем тех, у кого заполнена должность (считаем это признаком заполненной анкеты)
@@ -253,7 +252,7 @@ def _fetch_next_candidate_stub(user_telegram_id: int, context: CallbackContext):
 
     if candidate:
         # Добавляем ID найденного в список просмотренных
-        seen_ids.add(candidate.id)
+        seen_ids.append(candidate.id)
         context.user_data["networking_seen_ids"] = seen_ids
 
         # Превращаем объект модели в словарь для функции отображения
@@ -1,65 +1,387 @@
 import logging
+import threading
+import time
+from datetime import timedelta
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
 from telegram import Bot
+from telegram.utils.request import Request
 
 from datacenter.models import Subscription, Notification, UserNotification, Participant
-from tg_bot.config import TELEGRAM_BOT_TOKEN
+from tg_bot.broadcast import DEFAULT_WORKERS, Broadcaster, BroadcastResult
+from tg_bot.config import TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN
 
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_DELIVERY_FLUSH_SIZE = 200
+DEFAULT_DELIVERY_LEASE_SECONDS = 300
+INTERRUPTED_ERROR = "Отправка прервана остановкой процесса"
+
+
+def reminder_title(event, speech=None):
+    return f"Напоминание: {speech.title if speech else event.title}"
+
+
+def render_notification(notification):
+    """Текст и parse_mode сообщения, которое рассылается для уведомления."""
+    event = notification.event
+    if notification.notification_type == 'program_change':
+        text = (
+            f"*Изменения в программе*\n\n"
+            f"*{event.title}*\n\n"
+            f"{notification.message}\n\n"
+            f"Используй /program чтобы посмотреть актуальное расписание"
+        )
+        return text, 'Markdown'
+    if notification.notification_type == 'new_event':
+        text = (
+            f"*Новое мероприятие!*\n\n"
+            f"*{event.title}*\n\n"
+            f"{event.description}\n\n"
+            f"Дата: {timezone.localtime(event.date).strftime('%d.%m.%Y %H:%M')}\n\n"
+            f"Используй /subscribe чтобы подписаться на уведомления об этом мероприятии"
+        )
+        return text, 'Markdown'
+    return notification.message, None
+
+
+class DeliveryBuffer:
+    """Копит результаты отправки и пишет их в UserNotification пачками.
+
+    Записи о доставке создаются заранее в статусе pending, здесь им
+    проставляется итоговый статус через bulk_update. Используется как
+    контекстный менеджер: при выходе, в том числе по исключению, остаток
+    сбрасывается в базу.
+    """
+
+    def __init__(self, notification, records, chunk_size=None, lease=None):
+        self.notification = notification
+        self.records = records
+        self.chunk_size = chunk_size or get_delivery_flush_size()
+        self.lease = lease
+        self.to_update = []
+        self.unreachable_ids = []
+
+    def add(self, outcome):
+        if self.lease:
+            self.lease.renew()
+        if outcome.unreachable:
+            self.unreachable_ids.append(outcome.participant.id)
+
+        record = self.records[outcome.participant.id]
+        record.attempts += outcome.attempts
+        record.status = outcome.status
+        record.last_error = str(outcome.error) if outcome.error else ''
+        self.to_update.append(record)
+
+        if len(self.to_update) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.to_update:
+            return
+        to_update, self.to_update = self.to_update, []
+        unreachable_ids, self.unreachable_ids = self.unreachable_ids, []
+        with transaction.atomic():
+            if unreachable_ids:
+                Participant.objects.filter(id__in=unreachable_ids).update(
+                    is_reachable=False,
+                    unreachable_since=timezone.now()
+                )
+            UserNotification.objects.bulk_update(
+                to_update,
+                ['status', 'attempts', 'last_error'],
+                batch_size=self.chunk_size
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush delivery records for notification {self.notification.id}: {e}")
+            if exc_type is None:
+                raise
+        return False
+
+
+def get_delivery_flush_size():
+    return settings.NOTIFICATION_SETTINGS.get("delivery_flush_size", DEFAULT_DELIVERY_FLUSH_SIZE)
+
+
+def get_delivery_lease_seconds():
+    return settings.NOTIFICATION_SETTINGS.get("delivery_lease_seconds", DEFAULT_DELIVERY_LEASE_SECONDS)
+
+
+def expired_lease_filter(seconds=None):
+    """Рассылки, аренду которых никто не продлевал дольше срока."""
+    expired_before = timezone.now() - timedelta(seconds=seconds or get_delivery_lease_seconds())
+    return Q(claimed_at__isnull=True) | Q(claimed_at__lt=expired_before)
+
+
+class DeliveryLease:
+    """Аренда рассылки процессом, который её отправляет.
+
+    Пока рассылка идёт, Notification.claimed_at продлевается по мере
+    доставки, не чаще раза в треть срока аренды. Рассылку с истёкшей
+    арендой resume_interrupted() считает прерванной и забирает себе.
+    """
+
+    def __init__(self, notification, seconds=None, clock=time.monotonic):
+        self.notification = notification
+        self.seconds = seconds or get_delivery_lease_seconds()
+        self.clock = clock
+        self.renewed_at = None
+
+    def acquire(self):
+        """Забирает рассылку с истёкшей арендой. False, если её уже кто-то ведёт."""
+        acquired = Notification.objects.filter(
+            expired_lease_filter(self.seconds),
+            pk=self.notification.pk,
+            is_sent=False
+        ).update(claimed_at=timezone.now())
+        if acquired:
+            self.renewed_at = self.clock()
+        return bool(acquired)
+
+    def renew(self, force=False):
+        now = self.clock()
+        if not force and self.renewed_at is not None and now - self.renewed_at < self.seconds / 3:
+            return
+        Notification.objects.filter(pk=self.notification.pk).update(claimed_at=timezone.now())
+        self.renewed_at = now
+
+
 class NotificationService:
+    """Рассылка уведомлений подписчикам.
+
+    Рассылка идёт в два шага. plan_* в одной транзакции создаёт Notification
+    и записи UserNotification в статусе pending для всей аудитории. deliver()
+    отправляет pending-записи окнами по delivery_flush_size, двигаясь по
+    возрастанию id, и после каждого окна сохраняет результат. Перед отправкой
+    окно помечается как sending; отправляются только записи, которые
+    удалось так захватить. Процесс, который ведёт рассылку, держит её
+    аренду (DeliveryLease). Если процесс упал и аренда истекла,
+    resume_interrupted() продолжит с первой pending-записи, а записи,
+    застрявшие в sending, переведёт в failed, чтобы никому не отправить
+    уведомление дважды.
+    """
+
     def __init__(self, bot):
         self.bot = bot
-    
-    def send_program_change_notification(self, event, change_description):
-        try:
-            subscriptions = Subscription.objects.filter(
+        self.broadcaster = Broadcaster(bot)
+
+    def _plan(self, participant_ids, **notification_fields):
+        with transaction.atomic():
+            # Рассылку сразу арендует создавший её процесс
+            notification = Notification.objects.create(claimed_at=timezone.now(), **notification_fields)
+            UserNotification.objects.bulk_create(
+                [
+                    UserNotification(participant_id=participant_id, notification=notification)
+                    for participant_id in participant_ids
+                ],
+                batch_size=get_delivery_flush_size()
+            )
+        return notification
+
+    def _claim(self, records, statuses):
+        """Переводит записи в sending и возвращает только те, что удалось захватить.
+
+        Запись захватывается, только если она всё ещё в одном из statuses,
+        поэтому два потока, прочитавшие одно окно, не отправят его дважды.
+        """
+        with transaction.atomic():
+            claimed_ids = set(
+                UserNotification.objects.select_for_update().filter(
+                    id__in=[record.id for record in records],
+                    status__in=statuses
+                ).values_list('id', flat=True)
+            )
+            UserNotification.objects.filter(id__in=claimed_ids).update(status='sending')
+        return [record for record in records if record.id in claimed_ids]
+
+    def _send_records(self, notification, records, result, lease, statuses=('pending',)):
+        records = self._claim(records, statuses)
+        if not records:
+            return
+
+        text, parse_mode = render_notification(notification)
+        records_by_participant = {record.participant_id: record for record in records}
+        with DeliveryBuffer(notification, records_by_participant, lease=lease) as deliveries:
+            window_result = self.broadcaster.send(
+                [record.participant for record in records],
+                text,
+                parse_mode=parse_mode,
+                on_result=deliveries.add
+            )
+        result.delivered.extend(window_result.delivered)
+        result.failed.extend(window_result.failed)
+
+    def deliver(self, notification, lease=None):
+        result = BroadcastResult()
+        lease = lease or DeliveryLease(notification)
+        cursor = 0
+        while True:
+            lease.renew(force=True)
+            records = list(
+                UserNotification.objects.filter(
+                    notification=notification,
+                    status='pending',
+                    id__gt=cursor
+                ).select_related('participant').order_by('id')[:get_delivery_flush_size()]
+            )
+            if not records:
+                break
+            cursor = records[-1].id
+            self._send_records(notification, records, result, lease)
+
+        notification.is_sent = True
+        notification.save(update_fields=['is_sent'])
+
+        logger.info(
+            f"Broadcast '{notification.title}' finished: "
+            f"delivered {result.delivered_count}, failed {result.failed_count}"
+        )
+        return result
+
+    def resume_interrupted(self):
+        """Досылает рассылки, которые прервались: их процесс упал и аренда истекла.
+
+        Рассылки, аренду которых продлевает живой процесс (веб-админка,
+        другой runbot или runoutbox), не трогаются.
+        """
+        notifications = Notification.objects.filter(
+            expired_lease_filter(),
+            is_sent=False
+        ).select_related('event')
+        resumed = 0
+        for notification in notifications:
+            lease = DeliveryLease(notification)
+            if not lease.acquire():
+                continue
+
+            interrupted = UserNotification.objects.filter(
+                notification=notification,
+                status='sending'
+            ).update(status='failed', last_error=INTERRUPTED_ERROR)
+            if interrupted:
+                logger.warning(f"{interrupted} deliveries were interrupted mid-send and marked as failed")
+
+            logger.info(f"Resuming broadcast '{notification.title}'")
+            self.deliver(notification, lease)
+            resumed += 1
+        return resumed
+
+    def redeliver(self, user_notifications):
+        """Повторно отправляет уведомления по выбранным записям о доставке."""
+        by_notification = {}
+        for user_notification in user_notifications:
+            by_notification.setdefault(user_notification.notification, []).append(user_notification)
+
+        result = BroadcastResult()
+        for notification, records in by_notification.items():
+            # Недосланную рассылку, которую сейчас повторяют, не забирают как прерванную
+            lease = DeliveryLease(notification)
+            chunk_size = get_delivery_flush_size()
+            for offset in range(0, len(records), chunk_size):
+                lease.renew(force=True)
+                self._send_records(
+                    notification, records[offset:offset + chunk_size], result, lease, statuses=('failed', 'dead')
+                )
+        return result.delivered_count
+
+    def plan_program_change_notification(self, event, change_description):
+        participant_ids = list(
+            Subscription.objects.filter(
                 event=event,
-                notify_program_changes=True
-            ).select_related('participant')
-            
-            if not subscriptions.exists():
-                logger.info(f"No subscribers for program changes in event {event.title}")
-                return 0
-            
-            notification = Notification.objects.create(
+                notify_program_changes=True,
+                participant__is_reachable=True
+            ).values_list('participant_id', flat=True)
+        )
+
+        if not participant_ids:
+            logger.info(f"No subscribers for program changes in event {event.title}")
+            return None
+
+        return self._plan(
+            participant_ids,
+            event=event,
+            title=f"Изменения в программе {event.title}",
+            message=change_description,
+            notification_type='program_change'
+        )
+
+    def plan_new_event_notification(self, event):
+        participant_ids = list(
+            Participant.objects.filter(is_reachable=True).annotate(
+                subscriptions_count=Count('subscription'),
+                new_events_count=Count(
+                    'subscription',
+                    filter=Q(subscription__notify_new_events=True)
+                ),
+            ).filter(
+                Q(subscriptions_count=0) | Q(new_events_count__gt=0)
+            ).values_list('id', flat=True)
+        )
+
+        if not participant_ids:
+            logger.info(f"No subscribers for events")
+            return None
+
+        with transaction.atomic():
+            Subscription.objects.bulk_create(
+                [Subscription(participant_id=participant_id, event=event) for participant_id in participant_ids],
+                ignore_conflicts=True
+            )
+            return self._plan(
+                participant_ids,
                 event=event,
-                title=f"Изменения в программе {event.title}",
-                message=change_description,
-                notification_type='program_change'
+                title=f"Новое мероприятие: {event.title}",
+                message=event.description,
+                notification_type='new_event'
             )
+
+    def plan_reminder_notification(self, event, speech=None, scheduled_for=None):
+        participant_ids = list(
+            Subscription.objects.filter(
+                event=event,
+                notify_reminders=True,
+                participant__is_reachable=True
+            ).values_list('participant_id', flat=True)
+        )
+
+        if speech:
+            start_time = timezone.localtime(speech.start_time)
+            message = f"*Скоро начнется выступление!*\n\n{speech.speaker.name}\n*{speech.title}*\n\nНачало: {start_time.strftime('%H:%M')}"
+        else:
+            start_time = timezone.localtime(event.date)
+            message = f"*Скоро начнется мероприятие!*\n\n{event.title}\n\nНачало: {start_time.strftime('%H:%M')}"
+
+        return self._plan(
+            participant_ids,
+            event=event,
+            title=reminder_title(event, speech),
+            message=message,
+            notification_type='reminder',
+            scheduled_for=scheduled_for,
+            speech_id=speech.id if speech else None
+        )
+
+    def send_program_change_notification(self, event, change_description):
+        try:
+            notification = self.plan_program_change_notification(event, change_description)
+            if not notification:
+                return 0
+
+            result = self.deliver(notification)
             
-            sent_count = 0
-            for subscription in subscriptions:
-                try:
-                    message_text = (
-                        f"*Изменения в программе*\n\n"
-                        f"*{event.title}*\n\n"
-                        f"{change_description}\n\n"
-                        f"Используй /program чтобы посмотреть актуальное расписание"
-                    )
-                    
-                    self.bot.send_message(
-                        chat_id=subscription.participant.telegram_id,
-                        text=message_text,
-                        parse_mode='Markdown'
-                    )
-                    
-                    UserNotification.objects.create(
-                        participant=subscription.participant,
-                        notification=notification
-                    )
-                    sent_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Failed to send notification to {subscription.participant.telegram_id}: {e}")
-            
-            notification.is_sent = True
-            notification.save()
-            
-            logger.info(f"Sent {sent_count} program change notifications for event {event.title}")
-            return sent_count
+            logger.info(f"Sent {result.delivered_count} program change notifications for event {event.title}")
+            return result.delivered_count
             
         except Exception as e:
             logger.error(f"Error sending program change notifications: {e}")
@@ -68,124 +390,77 @@ class NotificationService:
     
     def send_new_event_notification(self, event):
         try:
-            participants = Participant.objects.all()
+            notification = self.plan_new_event_notification(event)
+            if not notification:
+                return 0
 
-            if not participants.exists:
-                logger.info(f"No subscribers for events")
-            
-            notification = Notification.objects.create(
-                event=event,
-                title=f"Новое мероприятие: {event.title}",
-                message=event.description,
-                notification_type='new_event'
-            )
-            
-            sent_count = 0
-            for participant in participants:
-                try:
-                    has_new_events_enabled = Subscription.objects.filter(
-                        participant=participant,
-                        notify_new_events=True
-                    ).exists()
-
-                    if not Subscription.objects.filter(participant=participant).exists():
-                        has_new_events_enabled = True
-                
-                    if not has_new_events_enabled:
-                        continue
-                
-                    subscription, created = Subscription.objects.get_or_create(
-                        participant=participant,
-                        event=event,
-                        defaults={
-                            'notify_program_changes': True,
-                            'notify_new_events': True,
-                            'notify_reminders': True
-                        }
-                    )
-                
-                    message_text = (
-                        f"*Новое мероприятие!*\n\n"
-                        f"*{event.title}*\n\n"
-                        f"{event.description}\n\n"
-                        f"Дата: {event.date.strftime('%d.%m.%Y %H:%M')}\n\n"
-                        f"Используй /subscribe чтобы подписаться на уведомления об этом мероприятии"
-                    )
-                
-                    self.bot.send_message(
-                        chat_id=participant.telegram_id,
-                        text=message_text,
-                        parse_mode="Markdown"
-                    )
-                
-                    UserNotification.objects.create(
-                        participant=participant,
-                        notification=notification
-                    )
-                
-                    sent_count += 1
-                    logger.info(f"Sent new event notification to {participant.telegram_id}")
-                
-                except Exception as e:
-                    logger.error(f"Failed to send new event notification to {participant.telegram_id}: {e}")
-        
-            notification.is_sent = True
-            notification.save()
+            result = self.deliver(notification)
         
-            logger.info(f"Sent {sent_count} new event notifications for event {event.title}")
-            return sent_count
+            logger.info(f"Sent {result.delivered_count} new event notifications for event {event.title}")
+            return result.delivered_count
         
         except Exception as e:
             logger.error(f"Error sending new event notifications: {e}")
             return 0
 
     
-    def send_reminder_notification(self, event, speech=None):
+    def send_reminder_notification(self, event, speech=None, scheduled_for=None):
         try:
-            subscriptions = Subscription.objects.filter(
-                event=event,
-                notify_reminders=True
-            ).select_related('participant')
+            notification = self.plan_reminder_notification(event, speech, scheduled_for)
+            result = self.deliver(notification)
             
-            if speech:
-                message = f"*Скоро начнется выступление!*\n\n{speech.speaker.name}\n*{speech.title}*\n\nНачало: {speech.start_time.strftime('%H:%M')}"
-                title = f"Напоминание: {speech.title}"
-            else:
-                message = f"*Скоро начнется мероприятие!*\n\n{event.title}\n\nНачало: {event.date.strftime('%H:%M')}"
-                title = f"Напоминание: {event.title}"
-            
-            notification = Notification.objects.create(
-                event=event,
-                title=title,
-                message=message,
-                notification_type='reminder'
-            )
-            
-            sent_count = 0
-            for subscription in subscriptions:
-                try:
-                    self.bot.send_message(
-                        chat_id=subscription.participant.telegram_id,
-                        text=message
-                    )
-                    UserNotification.objects.create(
-                        participant=subscription.participant,
-                        notification=notification
-                    )
-                    sent_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to send reminder to {subscription.participant.telegram_id}: {e}")
-            
-            notification.is_sent = True
-            notification.save()
-            
-            logger.info(f"Sent {sent_count} reminder notifications")
-            return sent_count
+            logger.info(f"Sent {result.delivered_count} reminder notifications")
+            return result.delivered_count
             
         except Exception as e:
             logger.error(f"Error sending reminder notifications: {e}")
             return 0
 
+_bot = None
+_bot_dispatcher_workers = 0
+_notification_service = None
+_lock = threading.Lock()
+
+# Соединения для диспетчера, поллинга и фоновых потоков бота
+BOT_RUNTIME_CONNECTIONS = 8
+
+
+def get_bot(dispatcher_workers=None):
+    """Общий на процесс Bot с пулом keep-alive соединений.
+
+    Пул рассчитан на одновременную работу потоков рассылки и самого бота,
+    поэтому этот же объект передаётся в Updater в runbot. runbot передаёт
+    dispatcher_workers с учётом --workers; без него берётся значение из
+    BOT_SETTINGS. Размер пула задаёт первый вызов.
+    """
+    global _bot, _bot_dispatcher_workers
+    if dispatcher_workers is None:
+        dispatcher_workers = getattr(settings, "BOT_SETTINGS", {}).get("dispatcher_workers", 0)
+    with _lock:
+        if _bot is None:
+            con_pool_size = (
+                settings.NOTIFICATION_SETTINGS.get("broadcast_workers", DEFAULT_WORKERS)
+                + dispatcher_workers
+                + BOT_RUNTIME_CONNECTIONS
+            )
+            _bot = Bot(
+                token=TELEGRAM_BOT_TOKEN,
+                base_url=TELEGRAM_API_URL,
+                request=Request(con_pool_size=con_pool_size)
+            )
+            _bot_dispatcher_workers = dispatcher_workers
+        elif dispatcher_workers > _bot_dispatcher_workers:
+            logger.warning(
+                f"Bot connection pool is sized for {_bot_dispatcher_workers} dispatcher workers, "
+                f"{dispatcher_workers} requested"
+            )
+        return _bot
+
+
 def get_notification_service():
-    bot = Bot(token=TELEGRAM_BOT_TOKEN)
-    return NotificationService(bot)
+    global _notification_service
+    bot = get_bot()
+    with _lock:
+        if _notification_service is None:
+            _notification_service = NotificationService(bot)
+        return _notification_service
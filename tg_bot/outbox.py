@@ -0,0 +1,179 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min, Q
+from django.utils import timezone
+
+from datacenter.models import OutboxMessage
+from tg_bot.notifications import get_notification_service
+from tg_bot.workers import PeriodicWorker
+
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 50
+MAX_OUTBOX_ATTEMPTS = 3
+DEFAULT_COALESCE_SECONDS = 60
+DEFAULT_MAX_DELAY_SECONDS = 300
+
+
+def _plan(notification_service, outbox_message):
+    event = outbox_message.event
+    if outbox_message.kind == 'new_event':
+        return notification_service.plan_new_event_notification(event)
+    if outbox_message.kind == 'program_change':
+        return notification_service.plan_program_change_notification(event, outbox_message.message)
+    logger.warning(f"Unknown outbox message kind: {outbox_message.kind}")
+    return None
+
+
+def _deliver(notification_service, notification):
+    # Сообщение из очереди уже помечено обработанным: если отправка прервётся,
+    # её продолжит resume_interrupted(), когда истечёт аренда рассылки
+    if not notification:
+        return
+    try:
+        notification_service.deliver(notification)
+    except Exception as e:
+        logger.error(f"Broadcast '{notification.title}' was interrupted: {e}")
+
+
+def _mark_processed(outbox_ids):
+    OutboxMessage.objects.filter(pk__in=outbox_ids).update(
+        attempts=F('attempts') + 1,
+        processed_at=timezone.now()
+    )
+
+
+def _mark_failed(outbox_ids, error):
+    OutboxMessage.objects.filter(pk__in=outbox_ids).update(
+        attempts=F('attempts') + 1,
+        last_error=str(error)
+    )
+    OutboxMessage.objects.filter(
+        pk__in=outbox_ids,
+        attempts__gte=MAX_OUTBOX_ATTEMPTS
+    ).update(processed_at=timezone.now())
+
+
+def merge_change_descriptions(descriptions):
+    unique_descriptions = list(dict.fromkeys(descriptions))
+    if len(unique_descriptions) == 1:
+        return unique_descriptions[0]
+    return "\n".join(f"• {description}" for description in unique_descriptions)
+
+
+def _ready_program_change_events(now):
+    """Мероприятия, по которым серия изменений программы закончилась.
+
+    Изменения копятся, пока между ними проходит меньше coalesce-окна,
+    но не дольше max_delay с первого изменения.
+    """
+    notification_settings = settings.NOTIFICATION_SETTINGS
+    window = timedelta(seconds=notification_settings.get(
+        "program_change_coalesce_seconds", DEFAULT_COALESCE_SECONDS
+    ))
+    max_delay = timedelta(seconds=notification_settings.get(
+        "program_change_max_delay_seconds", DEFAULT_MAX_DELAY_SECONDS
+    ))
+    return list(
+        OutboxMessage.objects.filter(processed_at__isnull=True, kind='program_change')
+        .values('event_id')
+        .annotate(first_change=Min('created_at'), last_change=Max('created_at'))
+        .filter(Q(last_change__lte=now - window) | Q(first_change__lte=now - max_delay))
+        .values_list('event_id', flat=True)
+    )
+
+
+def process_program_changes(notification_service=None, now=None):
+    ready_event_ids = _ready_program_change_events(now or timezone.now())
+    if not ready_event_ids:
+        return 0
+
+    notification_service = notification_service or get_notification_service()
+    processed = 0
+
+    for event_id in ready_event_ids:
+        outbox_messages = list(
+            OutboxMessage.objects.filter(
+                processed_at__isnull=True,
+                kind='program_change',
+                event_id=event_id
+            ).select_related('event').order_by('id')
+        )
+        if not outbox_messages:
+            continue
+
+        outbox_ids = [outbox_message.pk for outbox_message in outbox_messages]
+        description = merge_change_descriptions(
+            outbox_message.message for outbox_message in outbox_messages
+        )
+        try:
+            # Рассылка и отметка об обработке фиксируются вместе, иначе после
+            # падения между ними изменения запланировались бы второй раз
+            with transaction.atomic():
+                notification = notification_service.plan_program_change_notification(
+                    outbox_messages[0].event, description
+                )
+                _mark_processed(outbox_ids)
+        except Exception as e:
+            logger.error(f"Failed to plan coalesced program change for event {event_id}: {e}")
+            _mark_failed(outbox_ids, e)
+            continue
+
+        processed += len(outbox_ids)
+        logger.info(f"Coalesced {len(outbox_ids)} program changes for event {event_id}")
+        _deliver(notification_service, notification)
+
+    return processed
+
+
+def process_outbox(notification_service=None, limit=OUTBOX_BATCH_SIZE):
+    outbox_messages = list(
+        OutboxMessage.objects.filter(processed_at__isnull=True)
+        .exclude(kind='program_change')
+        .select_related('event')
+        .order_by('id')[:limit]
+    )
+    if not outbox_messages:
+        return 0
+
+    notification_service = notification_service or get_notification_service()
+
+    for outbox_message in outbox_messages:
+        try:
+            with transaction.atomic():
+                notification = _plan(notification_service, outbox_message)
+                _mark_processed([outbox_message.pk])
+        except Exception as e:
+            logger.error(f"Failed to process outbox message {outbox_message.id}: {e}")
+            _mark_failed([outbox_message.pk], e)
+            continue
+
+        _deliver(notification_service, notification)
+
+    return len(outbox_messages)
+
+
+def drain_outbox(notification_service=None):
+    processed = 0
+    while True:
+        count = process_outbox(notification_service)
+        if not count:
+            break
+        processed += count
+    return processed + process_program_changes(notification_service)
+
+
+class OutboxWorker(PeriodicWorker):
+    interval = 2.0
+
+    def run_once(self):
+        # Рассылки, которые ведут живые процессы, продлевают аренду и не
+        # трогаются, поэтому прерванные можно подбирать на каждом проходе
+        get_notification_service().resume_interrupted()
+
+        processed = drain_outbox()
+        if processed:
+            logger.info(f"Processed {processed} outbox messages")
@@ -0,0 +1,104 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+from datacenter.models import Participant
+
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 300
+
+
+def telegram_full_name(user):
+    return f"{user.first_name} {user.last_name or ''}".strip()
+
+
+class ParticipantCache:
+    """LRU-кэш участников по telegram_id с ограниченным временем жизни.
+
+    Запись сбрасывается сигналом при сохранении или удалении участника в
+    этом процессе. Правки из админки видны после истечения TTL.
+    Наружу отдаются копии, чтобы обработчики не меняли общий объект.
+    """
+
+    def __init__(self, max_size=None, ttl=None, clock=time.monotonic):
+        bot_settings = getattr(settings, "BOT_SETTINGS", {})
+        self.max_size = max_size or bot_settings.get("participant_cache_size", DEFAULT_CACHE_SIZE)
+        self.ttl = ttl or bot_settings.get("participant_cache_ttl", DEFAULT_CACHE_TTL)
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def peek(self, telegram_id):
+        """Участник из кэша без обращения к базе."""
+        return self._get_cached(telegram_id)
+
+    def _get_cached(self, telegram_id):
+        with self.lock:
+            entry = self.entries.get(telegram_id)
+            if entry is None:
+                return None
+            participant, expires_at = entry
+            if expires_at <= self.clock():
+                del self.entries[telegram_id]
+                return None
+            self.entries.move_to_end(telegram_id)
+            return copy.copy(participant)
+
+    def put(self, participant):
+        with self.lock:
+            self.entries[participant.telegram_id] = (copy.copy(participant), self.clock() + self.ttl)
+            self.entries.move_to_end(participant.telegram_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, telegram_id):
+        with self.lock:
+            self.entries.pop(telegram_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get(self, telegram_id):
+        """Участник или None, если он ещё не заходил в бота."""
+        participant = self._get_cached(telegram_id)
+        if participant is None:
+            participant = Participant.objects.filter(telegram_id=telegram_id).first()
+            if participant is not None:
+                self.put(participant)
+        return participant
+
+    def get_or_create(self, user):
+        """Участник для пользователя Telegram; ник и имя обновляются, только если изменились."""
+        participant = self.get(user.id)
+        if participant is None:
+            participant, _ = Participant.objects.get_or_create(
+                telegram_id=user.id,
+                defaults={
+                    "username": user.username,
+                    "full_name": telegram_full_name(user),
+                }
+            )
+        else:
+            update_fields = []
+            if user.username and user.username != participant.username:
+                participant.username = user.username
+                update_fields.append("username")
+
+            full_name = telegram_full_name(user)
+            if full_name and full_name != participant.full_name:
+                participant.full_name = full_name
+                update_fields.append("full_name")
+
+            if not update_fields:
+                return participant
+            participant.save(update_fields=update_fields)
+
+        self.put(participant)
+        return participant
+
+
+participant_cache = ParticipantCache()
@@ -0,0 +1,229 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from datacenter.models import Question
+
+
+# Размер пространства хэшей для символьных триграмм, степень двойки:
+# хэш берётся по маске и переполнение при умножении ему не мешает
+VECTOR_SIZE = 512
+# Косинусная близость, начиная с которой вопросы считаются похожими
+SIMILARITY_THRESHOLD = 0.6
+# По сколько вопросов сравниваем за одно матричное умножение
+SIMILARITY_BLOCK = 128
+# Сколько докладов держим в памяти одновременно
+MAX_CACHED_SPEECHES = 32
+
+_HASH_MULTIPLIERS = np.array([1000003, 10007, 1], dtype=np.uint32)
+_SPACE = ord(" ")
+
+
+def _build_char_table(size=0x500):
+    """Таблица для латиницы и кириллицы: символ в нижнем регистре или пробел."""
+    table = np.full(size, _SPACE, dtype=np.uint32)
+    for code in range(size):
+        char = chr(code)
+        if char.isalnum():
+            table[code] = ord(char.lower()[0])
+    table[ord("ё")] = table[ord("Ё")] = ord("е")
+    return table
+
+
+_CHAR_TABLE = _build_char_table()
+
+
+def trigram_counts(texts):
+    """Матрица (len(texts), VECTOR_SIZE) с числом хэшированных триграмм в каждом тексте.
+
+    Все тексты склеиваются в один массив кодов символов, поэтому
+    нормализация и хэши считаются разом для всей пачки без цикла по вопросам.
+    """
+    padded = [f" {text} " for text in texts]
+    shape = (len(padded), VECTOR_SIZE)
+    codes = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32)
+    rows = np.repeat(np.arange(len(padded)), [len(text) for text in padded])
+
+    # Нижний регистр, знаки препинания в пробелы; прочие алфавиты как есть
+    known = codes < len(_CHAR_TABLE)
+    codes = np.where(known, _CHAR_TABLE[np.minimum(codes, len(_CHAR_TABLE) - 1)], codes)
+    is_space = codes == _SPACE
+    keep = np.ones(len(codes), dtype=bool)
+    keep[1:] = ~(is_space[1:] & is_space[:-1] & (rows[1:] == rows[:-1]))
+    codes, rows = codes[keep], rows[keep]
+
+    if len(codes) < 3:
+        return np.zeros(shape, dtype=np.float32)
+
+    # Триграммы на стыке двух текстов отбрасываем
+    same_row = rows[:-2] == rows[2:]
+    hashes = (
+        codes[:-2] * _HASH_MULTIPLIERS[0]
+        + codes[1:-1] * _HASH_MULTIPLIERS[1]
+        + codes[2:] * _HASH_MULTIPLIERS[2]
+    ) & (VECTOR_SIZE - 1)
+    cells = rows[:-2][same_row] * VECTOR_SIZE + hashes[same_row].astype(np.int64)
+    return np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape).astype(np.float32)
+
+
+class SpeechQuestionClusters:
+    """Группы похожих вопросов одного доклада.
+
+    Вопросы добавляются по мере поступления: новый вопрос сравнивается по
+    TF-IDF на символьных триграммах с первым вопросом каждой группы и попадает
+    в самую близкую, если близость не меньше SIMILARITY_THRESHOLD, иначе
+    открывает новую группу. Уже распределённые вопросы не пересчитываются.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.ids = []
+        self.labels = []
+        self.representatives = []
+        # Матрицы растут с запасом, заполнены первые len(self.ids) строк
+        self.tf = np.zeros((0, VECTOR_SIZE), dtype=np.float32)
+        self.tf_squared = np.zeros((0, VECTOR_SIZE), dtype=np.float32)
+        self.document_frequency = np.zeros(VECTOR_SIZE, dtype=np.float32)
+        self.last_question_id = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _reserve(self, size):
+        if size <= len(self.tf):
+            return
+        capacity = max(size, 2 * len(self.tf), 64)
+        for name in ("tf", "tf_squared"):
+            grown = np.zeros((capacity, VECTOR_SIZE), dtype=np.float32)
+            grown[:len(self.ids)] = getattr(self, name)[:len(self.ids)]
+            setattr(self, name, grown)
+
+    def add(self, question_ids, texts):
+        if not question_ids:
+            return
+
+        counts = trigram_counts(texts)
+        offset, total = len(self.ids), len(self.ids) + len(question_ids)
+        self._reserve(total)
+        np.log1p(counts, out=self.tf[offset:total])
+        np.square(self.tf[offset:total], out=self.tf_squared[offset:total])
+        self.document_frequency += np.count_nonzero(counts, axis=0)
+
+        idf = np.log((1 + total) / (1 + self.document_frequency)) + 1
+        weights = (idf * idf).astype(np.float32)
+        # Нормы векторов tf * idf, без построения взвешенной копии всей матрицы
+        norms = np.sqrt(self.tf_squared[:total] @ weights)
+        norms[norms == 0] = 1
+
+        # Единичные векторы новых вопросов и они же с весами idf²:
+        # их произведение — косинусная близость по TF-IDF
+        units = self.tf[offset:total] / norms[offset:total, None]
+        weighted = units * weights
+        representatives = np.array(self.representatives, dtype=np.int64)
+        groups = np.empty((len(representatives) + total - offset, VECTOR_SIZE), dtype=np.float32)
+        groups[:len(representatives)] = self.tf[representatives] / norms[representatives, None]
+        labels = np.empty(total - offset, dtype=np.int64)
+
+        # Вопрос сравнивается с первыми вопросами уже существующих групп.
+        # Пачка обрабатывается блоками: близость к прежним группам и внутри
+        # блока считается матричным умножением. По порядку, в цикле,
+        # распределяются только вопросы, похожие на более ранний вопрос
+        # того же блока: остальные либо попадают в прежнюю группу, либо
+        # открывают новую независимо от соседей.
+        for start in range(offset, total, SIMILARITY_BLOCK):
+            end = min(start + SIMILARITY_BLOCK, total)
+            size = end - start
+            block = weighted[start - offset:end - offset]
+            unit = units[start - offset:end - offset]
+
+            block_labels = start + np.arange(size)
+            best_similarity = np.full(size, self.threshold, dtype=np.float32)
+            if len(representatives):
+                to_groups = block @ groups[:len(representatives)].T
+                best_group = to_groups.argmax(axis=1)
+                similarity = to_groups[np.arange(size), best_group]
+                joined = similarity >= self.threshold
+                block_labels[joined] = representatives[best_group[joined]]
+                best_similarity[joined] = similarity[joined]
+            else:
+                joined = np.zeros(size, dtype=bool)
+            opens_group = ~joined
+
+            within_block = block @ unit.T
+            rows, columns = np.nonzero(np.tril(within_block >= self.threshold, -1))
+            bounds = np.searchsorted(rows, np.arange(size + 1))
+            for row in np.unique(rows).tolist():
+                candidates = columns[bounds[row]:bounds[row + 1]]
+                candidates = candidates[opens_group[candidates]]
+                if not len(candidates):
+                    continue
+                similarity = within_block[row, candidates]
+                best = similarity.argmax()
+                # При равной близости новая группа важнее прежней
+                if similarity[best] >= best_similarity[row]:
+                    block_labels[row] = start + candidates[best]
+                    opens_group[row] = False
+
+            labels[start - offset:end - offset] = block_labels
+            new_rows = np.flatnonzero(opens_group)
+            groups[len(representatives):len(representatives) + len(new_rows)] = unit[new_rows]
+            representatives = np.concatenate([representatives, start + new_rows])
+
+        self.labels.extend(labels.tolist())
+        self.representatives = representatives.tolist()
+        self.ids.extend(question_ids)
+        self.last_question_id = max(self.last_question_id, max(question_ids))
+
+    def clusters(self, question_ids=None):
+        """Группы в виде списков id, самые большие первыми.
+
+        Если передан question_ids, в группах остаются только эти вопросы,
+        например неотвеченные.
+        """
+        groups = {}
+        for question_id, label in zip(self.ids, self.labels):
+            if question_ids is None or question_id in question_ids:
+                groups.setdefault(label, []).append(question_id)
+        return sorted(groups.values(), key=lambda group: (-len(group), group[0]))
+
+
+class QuestionClusterIndex:
+    """Хранит группы вопросов по докладам и дочитывает из базы только новые вопросы.
+
+    Общая блокировка защищает только список докладов. Чтение новых вопросов
+    и их распределение по группам идут под блокировкой самого доклада,
+    поэтому спикеры разных докладов не ждут друг друга.
+    """
+
+    def __init__(self, max_speeches=MAX_CACHED_SPEECHES):
+        self.max_speeches = max_speeches
+        self.speeches = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _speech_clusters(self, speech_id):
+        with self.lock:
+            speech_clusters = self.speeches.pop(speech_id, None)
+            if speech_clusters is None:
+                speech_clusters = SpeechQuestionClusters()
+            self.speeches[speech_id] = speech_clusters
+            while len(self.speeches) > self.max_speeches:
+                self.speeches.popitem(last=False)
+            return speech_clusters
+
+    def clusters(self, speech_id, question_ids=None):
+        speech_clusters = self._speech_clusters(speech_id)
+        with speech_clusters.lock:
+            new_questions = list(
+                Question.objects.filter(speech_id=speech_id, id__gt=speech_clusters.last_question_id)
+                .order_by("id")
+                .values_list("id", "question_text")
+            )
+            if new_questions:
+                new_ids, texts = zip(*new_questions)
+                speech_clusters.add(list(new_ids), list(texts))
+            return speech_clusters.clusters(question_ids)
+
+
+cluster_index = QuestionClusterIndex()
@@ -0,0 +1,112 @@
+import logging
+from itertools import groupby
+from django.conf import settings
+from django.db.models import F
+
+from datacenter.models import Question, Speaker
+from tg_bot.broadcast import is_unreachable_error
+from tg_bot.notifications import get_bot
+from tg_bot.question_inbox import format_question
+from tg_bot.talks import TELEGRAM_MESSAGE_LIMIT, split_message
+from tg_bot.workers import PeriodicWorker
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIGEST_INTERVAL = 5.0
+# Сколько вопросов забираем за один проход, остальные уйдут в следующем
+DIGEST_BATCH_LIMIT = 500
+
+
+class QuestionDigestWorker(PeriodicWorker):
+    """Раз в question_digest_interval секунд отправляет спикерам новые вопросы.
+
+    У каждого спикера есть курсор last_pushed_question_id: в дайджест попадают
+    только вопросы с большим id, а курсор сдвигается после каждого
+    отправленного сообщения дайджеста. Если отправка упала, неотправленные
+    вопросы уйдут в следующем дайджесте; пропускаются они, только когда чат
+    спикера недоступен.
+    """
+
+    def __init__(self, bot=None, interval=None):
+        bot_settings = getattr(settings, "BOT_SETTINGS", {})
+        super().__init__(interval or bot_settings.get("question_digest_interval", DEFAULT_DIGEST_INTERVAL))
+        self.bot = bot
+
+    def run_once(self):
+        return self.push_digests()
+
+    def push_digests(self):
+        questions = list(
+            Question.objects.filter(
+                speech__speaker__telegram_id__isnull=False,
+                id__gt=F('speech__speaker__last_pushed_question_id')
+            )
+            .select_related('speech__speaker', 'participant')
+            .order_by('speech__speaker_id', 'id')[:DIGEST_BATCH_LIMIT]
+        )
+
+        sent = 0
+        for _, speaker_questions in groupby(questions, key=lambda question: question.speech.speaker_id):
+            speaker_questions = list(speaker_questions)
+            if self._push(speaker_questions[0].speech.speaker, speaker_questions):
+                sent += len(speaker_questions)
+        return sent
+
+    def _push(self, speaker, questions):
+        bot = self.bot or get_bot()
+        for text, last_question_id in render_digest(questions):
+            try:
+                bot.send_message(chat_id=speaker.telegram_id, text=text)
+            except Exception as e:
+                if not is_unreachable_error(e):
+                    # Любая другая ошибка, в том числе неожиданная, не должна терять вопросы
+                    logger.warning(f"Question digest for speaker {speaker.pk} postponed: {e}")
+                    return False
+                # Спикер заблокировал бота или чат не найден — не повторяем бесконечно
+                logger.error(f"Failed to send question digest to speaker {speaker.pk}: {e}")
+                self._advance(speaker, questions[-1].id)
+                return True
+            # Курсор сдвигаем после каждого сообщения: если следующее не уйдёт,
+            # уже отправленные вопросы не придут спикеру повторно
+            if last_question_id:
+                self._advance(speaker, last_question_id)
+        return True
+
+    def _advance(self, speaker, question_id):
+        Speaker.objects.filter(
+            pk=speaker.pk,
+            last_pushed_question_id__lt=question_id
+        ).update(last_pushed_question_id=question_id)
+
+
+def render_digest(questions, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Дайджест, разбитый на сообщения по границам вопросов.
+
+    Вопросы идут по возрастанию id, поэтому возвращаются пары
+    (текст, id последнего вопроса в сообщении), и после отправки сообщения
+    курсор спикера можно сдвинуть до этого id. Вопрос длиннее лимита
+    режется на несколько сообщений, у всех, кроме последнего, id — None.
+    """
+    parts = []
+    text, speech_id, last_question_id = "", None, None
+    numbers = {}
+    for question in questions:
+        index = numbers[question.speech_id] = numbers.get(question.speech_id, 0) + 1
+        entry = format_question(index, question)
+        header = f"Новые вопросы к докладу «{question.speech.title}»:\n"
+        block = entry if question.speech_id == speech_id else f"{header}\n{entry}"
+        if text and len(text) + len(block) + 1 > limit:
+            parts.append((text, last_question_id))
+            text, block = "", f"{header}\n{entry}"
+        text = f"{text}\n{block}" if text else block
+        speech_id, last_question_id = question.speech_id, question.id
+    if text:
+        parts.append((text, last_question_id))
+
+    messages = []
+    for text, last_question_id in parts:
+        pieces = split_message(text, limit)
+        messages.extend((piece, None) for piece in pieces[:-1])
+        messages.append((pieces[-1], last_question_id))
+    return messages
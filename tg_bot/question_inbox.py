@@ -0,0 +1,300 @@
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db.models import Q
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from telegram.ext import CallbackContext
+
+from datacenter.models import Question, Speech
+from .question_clusters import cluster_index
+
+
+logger = logging.getLogger(__name__)
+
+INBOX_PAGE_SIZE = 5
+# Длинные вопросы обрезаем, чтобы страница влезла в одно сообщение
+INBOX_QUESTION_LENGTH = 600
+INBOX_CALLBACK_PREFIX = "qi"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Режимы листания: после курсора, до курсора, начиная с курсора включительно
+NEXT_PAGE = "n"
+PREVIOUS_PAGE = "p"
+CURRENT_PAGE = "c"
+ANSWER_PAGE = "a"
+ANSWER_ONE = "1"
+SIMILAR = "s"
+ANSWER_GROUP = "g"
+
+# Сколько групп похожих вопросов показываем за раз
+MAX_SHOWN_GROUPS = 8
+
+
+def format_question(index, question, max_length=None):
+    participant = question.participant
+    username = participant.username or "ник не указан"
+    name = participant.full_name or username
+
+    contact = f"@{username}" if participant.username else "контакт: ник не указан"
+
+    question_text = question.question_text
+    if max_length and len(question_text) > max_length:
+        question_text = question_text[:max_length - 1] + "…"
+
+    return (
+        f"{index}. От {name} ({contact}):\n"
+        f"   {question_text}\n"
+    )
+
+
+def encode_cursor(question):
+    # Курсор должен влезть в 64 байта callback_data, поэтому время — в base36
+    microseconds = (question.created_at - EPOCH) // timedelta(microseconds=1)
+    return f"{_to_base36(microseconds)}:{question.id}"
+
+
+def decode_cursor(created_at, question_id):
+    return EPOCH + timedelta(microseconds=int(created_at, 36)), int(question_id)
+
+
+def _to_base36(number):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    result = ""
+    while True:
+        number, remainder = divmod(number, 36)
+        result = digits[remainder] + result
+        if not number:
+            return result
+
+
+def _after(cursor, inclusive=False):
+    created_at, question_id = cursor
+    id_lookup = "id__gte" if inclusive else "id__gt"
+    return Q(created_at__gt=created_at) | Q(created_at=created_at, **{id_lookup: question_id})
+
+
+def _before(cursor, inclusive=False):
+    created_at, question_id = cursor
+    id_lookup = "id__lte" if inclusive else "id__lt"
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, **{id_lookup: question_id})
+
+
+def _inbox_questions(speech_id, speaker_telegram_id):
+    return Question.objects.filter(
+        speech_id=speech_id,
+        speech__speaker__telegram_id=speaker_telegram_id,
+        is_answered=False
+    )
+
+
+def load_inbox_page(speech_id, speaker_telegram_id, mode=CURRENT_PAGE, cursor=None):
+    """Одна страница неотвеченных вопросов по ключу (created_at, id).
+
+    Страница читается одним запросом по частичному индексу question_inbox_idx
+    без сортировки во временном B-дереве, поэтому её стоимость не зависит
+    от того, сколько вопросов у доклада.
+    Возвращает (вопросы, есть_предыдущая, есть_следующая).
+    """
+    questions = _inbox_questions(speech_id, speaker_telegram_id).select_related("speech", "participant")
+
+    if mode == PREVIOUS_PAGE:
+        if cursor:
+            questions = questions.filter(_before(cursor))
+        questions = questions.order_by("-created_at", "-id")
+    else:
+        if cursor:
+            questions = questions.filter(_after(cursor, inclusive=mode == CURRENT_PAGE))
+        questions = questions.order_by("created_at", "id")
+
+    page = list(questions[:INBOX_PAGE_SIZE + 1])
+    has_more = len(page) > INBOX_PAGE_SIZE
+    page = page[:INBOX_PAGE_SIZE]
+
+    if mode == PREVIOUS_PAGE:
+        page.reverse()
+        return page, has_more, True
+    return page, cursor is not None, has_more
+
+
+def mark_answered(speech_id, speaker_telegram_id, first, last):
+    """Отмечает отвеченными все вопросы между двумя курсорами одним UPDATE."""
+    return _inbox_questions(speech_id, speaker_telegram_id).filter(
+        _after(first, inclusive=True),
+        _before(last, inclusive=True)
+    ).update(is_answered=True)
+
+
+def render_inbox_page(speech, page, has_previous, has_next):
+    if not page:
+        return (
+            f"Все вопросы к докладу «{speech.title}» отмечены отвеченными.\n"
+            "Новые вопросы появятся здесь и придут тебе в дайджесте."
+        ), None
+
+    lines = [
+        format_question(index, question, max_length=INBOX_QUESTION_LENGTH)
+        for index, question in enumerate(page, start=1)
+    ]
+    text = f"Вопросы к твоему докладу:\n«{speech.title}»\n\n" + "\n".join(lines)
+
+    first_cursor, last_cursor = encode_cursor(page[0]), encode_cursor(page[-1])
+    prefix = f"{INBOX_CALLBACK_PREFIX}:{{}}:{speech.id}"
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                f"✓ {index}",
+                callback_data=f"{prefix.format(ANSWER_ONE)}:{encode_cursor(question)}:{first_cursor}"
+            )
+            for index, question in enumerate(page, start=1)
+        ],
+        [
+            InlineKeyboardButton(
+                "Отметить все на странице",
+                callback_data=f"{prefix.format(ANSWER_PAGE)}:{first_cursor}:{last_cursor}"
+            )
+        ],
+    ]
+
+    navigation = []
+    if has_previous:
+        navigation.append(InlineKeyboardButton("« Назад", callback_data=f"{prefix.format(PREVIOUS_PAGE)}:{first_cursor}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton("Дальше »", callback_data=f"{prefix.format(NEXT_PAGE)}:{last_cursor}"))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("Похожие вопросы", callback_data=prefix.format(SIMILAR))])
+
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def render_similar_questions(speech, speaker_telegram_id):
+    """Группы похожих неотвеченных вопросов, каждая одной строкой с числом повторов."""
+    unanswered = set(_inbox_questions(speech.id, speaker_telegram_id).values_list("id", flat=True))
+    groups = [group for group in cluster_index.clusters(speech.id, unanswered) if len(group) > 1]
+    back = InlineKeyboardButton("« К вопросам", callback_data=f"{INBOX_CALLBACK_PREFIX}:{CURRENT_PAGE}:{speech.id}")
+
+    if not groups:
+        return (
+            f"Среди неотвеченных вопросов к докладу «{speech.title}» повторов нет."
+        ), InlineKeyboardMarkup([[back]])
+
+    shown = groups[:MAX_SHOWN_GROUPS]
+    questions = Question.objects.in_bulk([group[0] for group in shown])
+    lines = []
+    for index, group in enumerate(shown, start=1):
+        question_text = questions[group[0]].question_text
+        if len(question_text) > INBOX_QUESTION_LENGTH:
+            question_text = question_text[:INBOX_QUESTION_LENGTH - 1] + "…"
+        lines.append(f"{index}. ×{len(group)}\n   {question_text}\n")
+
+    text = f"Похожие вопросы к докладу «{speech.title}»:\n\n" + "\n".join(lines)
+    if len(groups) > len(shown):
+        text += f"\nИ ещё групп: {len(groups) - len(shown)}"
+
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                f"✓ {index}",
+                callback_data=f"{INBOX_CALLBACK_PREFIX}:{ANSWER_GROUP}:{speech.id}:{group[0]}"
+            )
+            for index, group in enumerate(shown, start=1)
+        ],
+        [back],
+    ]
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def mark_group_answered(speech_id, speaker_telegram_id, question_id):
+    unanswered = set(_inbox_questions(speech_id, speaker_telegram_id).values_list("id", flat=True))
+    for group in cluster_index.clusters(speech_id, unanswered):
+        if question_id in group:
+            return _inbox_questions(speech_id, speaker_telegram_id).filter(id__in=group).update(is_answered=True)
+    return 0
+
+
+def send_inbox(message, speech, speaker_telegram_id):
+    page, has_previous, has_next = load_inbox_page(speech.id, speaker_telegram_id)
+    text, reply_markup = render_inbox_page(speech, page, has_previous, has_next)
+    message.reply_text(text, reply_markup=reply_markup)
+
+
+def handle_inbox_callback(update: Update, context: CallbackContext) -> None:
+    query = update.callback_query
+    speaker_telegram_id = query.from_user.id
+
+    question_id = None
+    try:
+        _, action, speech_id, *arguments = query.data.split(":")
+        speech_id = int(speech_id)
+        if action == ANSWER_GROUP:
+            question_id = int(arguments[0])
+        else:
+            cursors = [decode_cursor(*arguments[i:i + 2]) for i in range(0, len(arguments), 2)]
+    except (ValueError, IndexError):
+        query.answer("Кнопка устарела, открой «Мои вопросы» ещё раз")
+        return
+
+    if action in (SIMILAR, ANSWER_GROUP):
+        _handle_similar_callback(query, action, speech_id, speaker_telegram_id, question_id)
+        return
+
+    if action in (ANSWER_ONE, ANSWER_PAGE):
+        if action == ANSWER_ONE:
+            marked = mark_answered(speech_id, speaker_telegram_id, cursors[0], cursors[0])
+            cursor = cursors[1]
+        else:
+            marked = mark_answered(speech_id, speaker_telegram_id, cursors[0], cursors[1])
+            cursor = cursors[0]
+        query.answer(f"Отмечено отвеченными: {marked}")
+        mode = CURRENT_PAGE
+    else:
+        query.answer()
+        mode, cursor = action, cursors[0] if cursors else None
+
+    page, has_previous, has_next = load_inbox_page(speech_id, speaker_telegram_id, mode, cursor)
+    if not page and cursor:
+        # Страница опустела — показываем ближайшую непустую
+        if mode == PREVIOUS_PAGE:
+            page, _, has_next = load_inbox_page(speech_id, speaker_telegram_id, CURRENT_PAGE, cursor)
+            has_previous = False
+        else:
+            page, has_previous, _ = load_inbox_page(speech_id, speaker_telegram_id, PREVIOUS_PAGE, cursor)
+            has_next = False
+
+    if page:
+        speech = page[0].speech
+    else:
+        speech = Speech.objects.filter(pk=speech_id, speaker__telegram_id=speaker_telegram_id).first()
+        if not speech:
+            query.edit_message_text("Доклад не найден.")
+            return
+
+    text, reply_markup = render_inbox_page(speech, page, has_previous, has_next)
+    _edit_message(query, text, reply_markup)
+
+
+def _handle_similar_callback(query, action, speech_id, speaker_telegram_id, question_id):
+    speech = Speech.objects.filter(pk=speech_id, speaker__telegram_id=speaker_telegram_id).first()
+    if not speech:
+        query.answer()
+        query.edit_message_text("Доклад не найден.")
+        return
+
+    if action == ANSWER_GROUP:
+        marked = mark_group_answered(speech_id, speaker_telegram_id, question_id)
+        query.answer(f"Отмечено отвеченными: {marked}")
+    else:
+        query.answer()
+
+    text, reply_markup = render_similar_questions(speech, speaker_telegram_id)
+    _edit_message(query, text, reply_markup)
+
+
+def _edit_message(query, text, reply_markup):
+    try:
+        query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            raise
+
@@ -0,0 +1,128 @@
+import logging
+import threading
+from django.conf import settings
+from django.db import transaction
+
+from datacenter.models import Participant, Question, Speech
+from tg_bot.participants import participant_cache
+from tg_bot.workers import PeriodicWorker
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_FLUSH_BATCH = 50
+
+
+class PendingQuestion:
+    def __init__(self, telegram_id, username, full_name, speech_id, question_text):
+        self.telegram_id = telegram_id
+        self.username = username
+        self.full_name = full_name
+        self.speech_id = speech_id
+        self.question_text = question_text
+
+
+class QuestionBuffer(PeriodicWorker):
+    """Принимает вопросы в память и пишет их в базу пачками.
+
+    Сброс происходит раз в question_flush_interval секунд или сразу, как
+    накопится question_flush_batch вопросов, а также при остановке потока.
+    Если поток не запущен, каждый вопрос сохраняется сразу.
+    """
+
+    def __init__(self, interval=None, max_batch=None):
+        bot_settings = getattr(settings, "BOT_SETTINGS", {})
+        super().__init__(interval or bot_settings.get("question_flush_interval", DEFAULT_FLUSH_INTERVAL))
+        self.max_batch = max_batch or bot_settings.get("question_flush_batch", DEFAULT_FLUSH_BATCH)
+        self.pending = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    def add(self, pending_question):
+        with self.lock:
+            self.pending.append(pending_question)
+            pending_count = len(self.pending)
+
+        if not self.is_alive():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to save questions, will retry on next flush: {e}")
+        elif pending_count >= self.max_batch:
+            self.wakeup()
+
+    def run_once(self):
+        self.flush()
+
+    def on_stop(self):
+        self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, []
+            if not pending:
+                return 0
+            try:
+                return self._save(pending)
+            except Exception:
+                # Возвращаем вопросы в начало очереди, чтобы не потерять их
+                with self.lock:
+                    self.pending[:0] = pending
+                raise
+
+    def _save(self, pending):
+        participant_ids = self._resolve_participants(pending)
+        speech_ids = set(
+            Speech.objects.filter(
+                id__in={question.speech_id for question in pending}
+            ).values_list('id', flat=True)
+        )
+
+        questions = []
+        for pending_question in pending:
+            if pending_question.speech_id not in speech_ids:
+                logger.warning(f"Dropping question from {pending_question.telegram_id}: speech was deleted")
+                continue
+            questions.append(Question(
+                speech_id=pending_question.speech_id,
+                participant_id=participant_ids[pending_question.telegram_id],
+                question_text=pending_question.question_text
+            ))
+
+        with transaction.atomic():
+            Question.objects.bulk_create(questions)
+        logger.info(f"Saved {len(questions)} questions")
+        return len(questions)
+
+    def _resolve_participants(self, pending):
+        participant_ids = {}
+        for question in pending:
+            participant = participant_cache.peek(question.telegram_id)
+            if participant is not None:
+                participant_ids[question.telegram_id] = participant.id
+
+        unknown = {question.telegram_id for question in pending} - participant_ids.keys()
+        if unknown:
+            participant_ids.update(
+                Participant.objects.filter(telegram_id__in=unknown).values_list('telegram_id', 'id')
+            )
+
+        missing = {}
+        for question in pending:
+            if question.telegram_id not in participant_ids:
+                missing.setdefault(question.telegram_id, Participant(
+                    telegram_id=question.telegram_id,
+                    username=question.username,
+                    full_name=question.full_name
+                ))
+        if missing:
+            Participant.objects.bulk_create(missing.values(), ignore_conflicts=True)
+            participant_ids.update(
+                Participant.objects.filter(telegram_id__in=missing).values_list('telegram_id', 'id')
+            )
+        return participant_ids
+
+
+question_buffer = QuestionBuffer()
@@ -0,0 +1,208 @@
+import heapq
+import itertools
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max
+from django.utils import timezone
+
+from datacenter.models import Event, Notification, OutboxMessage, Speech
+from tg_bot.notifications import get_notification_service
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REMINDER_MINUTES_BEFORE = 15
+# Как часто проверять очередь изменений, если ближайшее напоминание ещё не скоро
+CHANGES_POLL_SECONDS = 5.0
+# Полная перезагрузка расписания на случай изменений, не попавших в очередь
+FULL_RELOAD_INTERVAL = timedelta(hours=1)
+
+
+class ReminderScheduler(threading.Thread):
+    """Отправляет напоминания за reminder_minutes_before до начала выступлений и мероприятий.
+
+    Напоминания лежат в куче по времени отправки. Изменения программы
+    подхватываются из OutboxMessage по возрастанию id, поэтому при правке
+    выступления перепланируется только оно, без перечитывания всей таблицы.
+    """
+
+    def __init__(self, notification_service=None, clock=timezone.now, minutes_before=None):
+        super().__init__(name=self.__class__.__name__, daemon=True)
+        self.notification_service = notification_service
+        self.clock = clock
+        self.lead = timedelta(minutes=minutes_before or settings.NOTIFICATION_SETTINGS.get(
+            "reminder_minutes_before", DEFAULT_REMINDER_MINUTES_BEFORE
+        ))
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+        self.last_outbox_id = 0
+        self.loaded_at = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def schedule(self, key, start_time):
+        fire_at = start_time - self.lead
+        with self.lock:
+            if self.entries.get(key, (None,))[0] == fire_at:
+                return
+            entry = (fire_at, next(self.counter), key)
+            self.entries[key] = entry
+            heapq.heappush(self.heap, entry)
+
+    def unschedule(self, key):
+        # Запись остаётся в куче и будет пропущена при извлечении
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def next_fire_at(self):
+        with self.lock:
+            while self.heap and self.entries.get(self.heap[0][2]) is not self.heap[0]:
+                heapq.heappop(self.heap)
+            return self.heap[0][0] if self.heap else None
+
+    def load(self):
+        now = self.clock()
+        with self.lock:
+            self.heap = []
+            self.entries = {}
+        self.last_outbox_id = OutboxMessage.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+        speeches = Speech.objects.filter(
+            event__is_active=True,
+            start_time__gt=now
+        ).values_list('id', 'start_time')
+        for speech_id, start_time in speeches:
+            self._schedule_if_due(('speech', speech_id), start_time, now)
+
+        events = Event.objects.filter(is_active=True, date__gt=now).values_list('id', 'date')
+        for event_id, date in events:
+            self._schedule_if_due(('event', event_id), date, now)
+
+        self.loaded_at = now
+        logger.info(f"Reminder scheduler loaded {len(self.entries)} reminders")
+
+    def _schedule_if_due(self, key, start_time, now):
+        if start_time - self.lead > now or not self._already_sent(key, start_time):
+            self.schedule(key, start_time)
+
+    def _already_sent(self, key, start_time):
+        # Сверяем по id, а не по заголовку: его могут поменять после отправки
+        kind, object_id = key
+        reminders = Notification.objects.filter(
+            notification_type='reminder',
+            scheduled_for=start_time - self.lead
+        )
+        if kind == 'speech':
+            reminders = reminders.filter(speech_id=object_id)
+        else:
+            reminders = reminders.filter(event_id=object_id, speech_id__isnull=True)
+        return reminders.exists()
+
+    def refresh_speech(self, speech_id):
+        start_time = Speech.objects.filter(
+            pk=speech_id,
+            event__is_active=True,
+            start_time__gt=self.clock()
+        ).values_list('start_time', flat=True).first()
+        if start_time:
+            self._schedule_if_due(('speech', speech_id), start_time, self.clock())
+        else:
+            self.unschedule(('speech', speech_id))
+
+    def refresh_event(self, event_id):
+        date = Event.objects.filter(
+            pk=event_id,
+            is_active=True,
+            date__gt=self.clock()
+        ).values_list('date', flat=True).first()
+        if date:
+            self._schedule_if_due(('event', event_id), date, self.clock())
+        else:
+            self.unschedule(('event', event_id))
+        for speech_id in Speech.objects.filter(event_id=event_id).values_list('id', flat=True):
+            self.refresh_speech(speech_id)
+
+    def sync_changes(self):
+        changes = list(
+            OutboxMessage.objects.filter(id__gt=self.last_outbox_id)
+            .order_by('id')
+            .values_list('id', 'event_id', 'speech_id')
+        )
+        refreshed = set()
+        for outbox_id, event_id, speech_id in changes:
+            self.last_outbox_id = outbox_id
+            key = ('speech', speech_id) if speech_id else ('event', event_id)
+            if key in refreshed:
+                continue
+            refreshed.add(key)
+            if speech_id:
+                self.refresh_speech(speech_id)
+            else:
+                self.refresh_event(event_id)
+
+    def tick(self, now=None):
+        now = now or self.clock()
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                entry = heapq.heappop(self.heap)
+                if self.entries.get(entry[2]) is entry:
+                    del self.entries[entry[2]]
+                    due.append(entry)
+
+        for fire_at, _, key in due:
+            try:
+                self._fire(key, fire_at)
+            except Exception as e:
+                logger.error(f"Failed to send reminder {key}: {e}")
+        return len(due)
+
+    def _fire(self, key, fire_at):
+        kind, object_id = key
+        notification_service = self.notification_service or get_notification_service()
+        if kind == 'speech':
+            speech = Speech.objects.select_related('event', 'speaker').filter(pk=object_id).first()
+            if not speech or not speech.event.is_active:
+                return
+            if speech.start_time - self.lead != fire_at:
+                self.schedule(key, speech.start_time)
+                return
+            notification_service.send_reminder_notification(speech.event, speech, scheduled_for=fire_at)
+        else:
+            event = Event.objects.filter(pk=object_id).first()
+            if not event or not event.is_active:
+                return
+            if event.date - self.lead != fire_at:
+                self.schedule(key, event.date)
+                return
+            notification_service.send_reminder_notification(event, scheduled_for=fire_at)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                now = self.clock()
+                if self.loaded_at is None or now - self.loaded_at >= FULL_RELOAD_INTERVAL:
+                    self.load()
+                else:
+                    self.sync_changes()
+                self.tick()
+                next_fire_at = self.next_fire_at()
+            except Exception:
+                logger.exception("Error in reminder scheduler")
+                next_fire_at = None
+            finally:
+                close_old_connections()
+
+            timeout = CHANGES_POLL_SECONDS
+            if next_fire_at:
+                timeout = min(timeout, max((next_fire_at - self.clock()).total_seconds(), 0))
+            self.stop_event.wait(timeout)
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
@@ -0,0 +1,80 @@
+import logging
+import signal
+import threading
+import time
+from queue import Empty
+
+from telegram.error import TelegramError
+
+
+logger = logging.getLogger(__name__)
+
+
+class Deadline:
+    """Общий срок на остановку бота: каждый шаг получает оставшееся время.
+
+    Отсчёт начинается при первом вызове remaining(), то есть когда
+    остановка действительно началась. Без timeout срок не ограничен.
+    """
+
+    def __init__(self, timeout=None, clock=time.monotonic):
+        self.timeout = timeout
+        self.clock = clock
+        self.expires_at = None
+
+    def remaining(self):
+        if self.timeout is None:
+            return None
+        if self.expires_at is None:
+            self.expires_at = self.clock() + self.timeout
+        return max(0.0, self.expires_at - self.clock())
+
+    @property
+    def expired(self):
+        return self.remaining() == 0
+
+
+def join_queue(queue, deadline):
+    """Ждёт, пока все задачи очереди будут обработаны. False, если срок вышел."""
+    with queue.all_tasks_done:
+        while queue.unfinished_tasks:
+            remaining = deadline.remaining()
+            if remaining == 0:
+                return False
+            queue.all_tasks_done.wait(remaining)
+    return True
+
+
+def discard_queue(queue):
+    """Выбрасывает из очереди всё, что в ней осталось, и возвращает количество."""
+    discarded = 0
+    while True:
+        try:
+            queue.get_nowait()
+        except Empty:
+            return discarded
+        queue.task_done()
+        discarded += 1
+
+
+def confirm_updates(bot, offset):
+    """Подтверждает Telegram обработанные обновления с id меньше offset.
+
+    Long polling подтверждает пачку только следующим getUpdates, поэтому
+    без этого вызова последняя пачка пришла бы снова после перезапуска.
+    Вызывается, только если все полученные обновления обработаны: то, что
+    вернёт этот запрос, не обрабатывается и придёт после перезапуска.
+    """
+    try:
+        bot.get_updates(offset=offset, timeout=0)
+    except TelegramError as e:
+        logger.warning(f"Failed to confirm processed updates: {e}")
+
+
+def wait_for_stop_signal(signals=(signal.SIGINT, signal.SIGTERM)):
+    """Блокирует основной поток до SIGINT или SIGTERM."""
+    stop_event = threading.Event()
+    for signum in signals:
+        signal.signal(signum, lambda *args: stop_event.set())
+    while not stop_event.wait(1):
+        pass
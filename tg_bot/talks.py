@@ -1,9 +1,26 @@
+import logging
+from functools import lru_cache
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
 
-from datacenter.models import Event, Speech, Speaker, Participant, Question, Subscription
+from datacenter.models import Event, Speech, Speaker, Participant, Subscription
+from .cache import SCHEDULE_CACHE_KEY, SCHEDULE_CACHE_MAX_SECONDS
+from .events import get_current_event
 from .notifications import get_notification_service
+from .participants import participant_cache, telegram_full_name
+from .question_inbox import send_inbox
+from .questions import PendingQuestion, question_buffer
+from .timeline import get_timeline
+
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
 
 
 def start_ask_question(update: Update, context: CallbackContext) -> None:
@@ -42,39 +59,28 @@ def handle_question_if_waiting(
         context.user_data["awaiting_question"] = False
         return True
 
-    try:
-        participant, created = Participant.objects.get_or_create(
-            telegram_id=user.id,
-            defaults={
-                "username": user.username,
-                "full_name": f"{user.first_name} {user.last_name or ''}".strip()
-            }
-        )
-        speech = Speech.objects.get(id=speech_id)
-        question = Question.objects.create(
-            speech=speech,
-            participant=participant,
-            question_text=question_text
-        )
+    if not get_timeline().get(speech_id):
+        update.message.reply_text("Ошибка: выступление не найдено")
+        context.user_data["awaiting_question"] = False
+        return True
 
-        print(f"[QUESTION] from {user.id} (@{user.username}): {question_text}")
+    question_buffer.add(PendingQuestion(
+        telegram_id=user.id,
+        username=user.username or "",
+        full_name=telegram_full_name(user),
+        speech_id=speech_id,
+        question_text=question_text
+    ))
 
-        context.user_data["awaiting_question"] = False
-        context.user_data.pop("active_speech_id", None)
+    logger.info(f"Question from {user.id} (@{user.username}) to speech {speech_id}")
 
-        update.message.reply_text(
-            "Спасибо! Я передал твой вопрос спикеру.\n"
-            "Можешь задать ещё один или вернуться к программе/нетворкингу через меню."
-        )
-    
-    except Speech.DoesNotExist:
-        update.message.reply_text("Ошибка: выступление не найдено")
-        context.user_data["awaiting_question"] = False
-    except Exception as e:
-        print(f"Error saving question: {e}")
-        update.message.reply_text(
-            "Произошла ошибка при сохранении вопроса. Попробуйте позже"
-        )
+    context.user_data["awaiting_question"] = False
+    context.user_data.pop("active_speech_id", None)
+
+    update.message.reply_text(
+        "Спасибо! Я передал твой вопрос спикеру.\n"
+        "Можешь задать ещё один или вернуться к программе/нетворкингу через меню."
+    )
     return True
 
 
@@ -92,8 +98,7 @@ def _format_datetime(dt):
     return local_dt.strftime("%d.%m.%Y %H:%M")
 
 
-def _get_speech_status(speech):
-    now = timezone.now()
+def _get_speech_status(speech, now):
     if speech.start_time <= now <= speech.end_time:
         return "СЕЙЧАС"
     elif now < speech.start_time:
@@ -102,75 +107,112 @@ def _get_speech_status(speech):
         return "Завершено"
 
 
-def show_schedule(update: Update, context: CallbackContext) -> None:
-    try:
-        active_events = Event.objects.filter(is_active=True).order_by("date")
-        if not active_events.exists():
-            update.message.reply_text("В данный момент нет активных событий")
-            return
+def split_message(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    if len(text) <= limit:
+        return [text]
+
+    parts = []
+    current_part = ""
+    for line in text.split('\n'):
+        # Строку длиннее лимита приходится резать посередине
+        while len(line) >= limit:
+            if current_part:
+                parts.append(current_part)
+                current_part = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if len(current_part) + len(line) + 1 < limit:
+            current_part += line + '\n'
+        else:
+            parts.append(current_part)
+            current_part = line + '\n'
+
+    if current_part:
+        parts.append(current_part)
+    return parts
+
+
+def _render_schedule(now):
+    """Собирает программу всех активных мероприятий за два запроса.
+
+    Возвращает список пар (текст, parse_mode) и момент, когда у какого-то
+    выступления сменится статус — до него результат можно кэшировать.
+    """
+    participants_count = Subscription.objects.filter(
+        event=OuterRef("pk")
+    ).order_by().values("event").annotate(count=Count("id")).values("count")
+    active_events = list(
+        Event.objects.filter(is_active=True)
+        .order_by("date")
+        .annotate(participants_count=Coalesce(Subquery(participants_count), 0))
+        .prefetch_related(Prefetch(
+            "speech_set",
+            queryset=Speech.objects.select_related("speaker").order_by("start_time"),
+            to_attr="program"
+        ))
+    )
+    if not active_events:
+        return [("В данный момент нет активных событий", None)], None
+
+    messages = []
+    status_changes = []
+
+    for event in active_events:
+        if not event.program:
+            continue
         
-        messages = []
-
-        for event in active_events:
-            speeches = Speech.objects.filter(event=event).select_related("speaker").order_by("start_time")
-            
-            if not speeches.exists():
-                continue
-            
-            event_text = f"*{event.title}*\n"
-            event_text += f"Дата: {_format_datetime(event.date)}\n"
-            event_text += f"Участников: {event.total_participants} | Выступлений: {event.total_speeches}\n\n"
-            
-            for idx, speech in enumerate(speeches, 1):
-                status = _get_speech_status(speech)
-                event_text += f"{idx}. {status}\n"
-                event_text += f"{_format_time(speech.start_time)} - {_format_time(speech.end_time)}\n"
-                event_text += f"Спикер: {speech.speaker.name}\n"
-                event_text += f"Тема: *{speech.title}*\n"        
-                event_text += "\n"
-            
-            messages.append(event_text)
+        event_text = f"*{event.title}*\n"
+        event_text += f"Дата: {_format_datetime(event.date)}\n"
+        event_text += f"Участников: {event.participants_count} | Выступлений: {len(event.program)}\n\n"
         
-        if not messages:
-            update.message.reply_text("У активных мероприятий пока нет запланированных выступлений")
-            return
+        for idx, speech in enumerate(event.program, 1):
+            status = _get_speech_status(speech, now)
+            event_text += f"{idx}. {status}\n"
+            event_text += f"{_format_time(speech.start_time)} - {_format_time(speech.end_time)}\n"
+            event_text += f"Спикер: {speech.speaker.name}\n"
+            event_text += f"Тема: *{speech.title}*\n"        
+            event_text += "\n"
+            status_changes.extend(
+                moment for moment in (speech.start_time, speech.end_time) if moment > now
+            )
         
-        for message in messages:
-            if len(message) > 4096:
-                parts = []
-                lines = message.split('\n')
-                current_part = ""
-                
-                for line in lines:
-                    if len(current_part) + len(line) + 1 < 4096:
-                        current_part += line + '\n'
-                    else:
-                        parts.append(current_part)
-                        current_part = line + '\n'
-                
-                if current_part:
-                    parts.append(current_part)
-                
-                for part in parts:
-                    update.message.reply_text(part, parse_mode='Markdown')
-            else:
-                update.message.reply_text(message, parse_mode='Markdown')
+        messages.extend((part, 'Markdown') for part in split_message(event_text))
+    
+    if not messages:
+        return [("У активных мероприятий пока нет запланированных выступлений", None)], None
+
+    return messages, min(status_changes, default=None)
+
+
+def get_schedule_messages():
+    messages = cache.get(SCHEDULE_CACHE_KEY)
+    if messages is not None:
+        return messages
+
+    now = timezone.now()
+    messages, valid_until = _render_schedule(now)
+    timeout = SCHEDULE_CACHE_MAX_SECONDS
+    if valid_until:
+        timeout = min(timeout, max((valid_until - now).total_seconds(), 1))
+    cache.set(SCHEDULE_CACHE_KEY, messages, timeout)
+    return messages
+
+
+def show_schedule(update: Update, context: CallbackContext) -> None:
+    try:
+        for text, parse_mode in get_schedule_messages():
+            update.message.reply_text(text, parse_mode=parse_mode)
         
     except Exception as e:
         logger.error(f"Error showing schedule: {e}")
         update.message.reply_text("Произошла ошибка при загрузке программы мероприятий")
 
 
-def get_active_speech():
+def get_active_speech(now=None):
     try:
-        now = timezone.now()
-        return Speech.objects.filter(
-            start_time__lte=now,
-            end_time__gte=now,
-            # is_active=True   ## нет необходимости, определяется автоматом
-        ).select_related("speaker").first()
+        return get_timeline().active_at(now or timezone.now())
     except Exception as e:
-        print(f"Error getting active speech: {e}")
+        logger.error(f"Error getting active speech: {e}")
         return None
 
 
@@ -187,7 +229,7 @@ def show_speaker_questions(update: Update, context: CallbackContext) -> None:
         )
         return
 
-    event = Event.objects.filter(is_active=True).first()
+    event = get_current_event()
 
     speech = None
 
@@ -209,46 +251,20 @@ def show_speaker_questions(update: Update, context: CallbackContext) -> None:
         )
         return
 
-    questions = (
-        Question.objects.filter(speech=speech)
-        .select_related("participant")
-        .order_by("created_at")
-    )
-
-    if not questions.exists():
-        update.message.reply_text(
-            f"К докладу «{speech.title}» пока нет вопросов.\n"
-            "Можешь открыть бот ещё раз позже, они появятся к концу выступления."
-        )
-        return
-
-    header = (
-        f"Вопросы к твоему докладу:\n"
-        f"«{speech.title}»\n\n"
-    )
-
-    lines = []
-    for index, question in enumerate(questions, start=1):
-        participant = question.participant
-        username = participant.username or "ник не указан"
-        name = participant.full_name or username
-
-        contact = f"@{username}" if participant.username else "контакт: ник не указан"
-
-        lines.append(
-            f"{index}. От {name} ({contact}):\n"
-            f"   {question.question_text}\n"
-        )
-
-    text = header + "\n".join(lines)
+    # Вопросы могут ещё лежать в буфере записи; если база не ответила,
+    # показываем уже сохранённые, а буфер допишется фоновым потоком
+    try:
+        question_buffer.flush()
+    except Exception as e:
+        logger.error(f"Failed to flush buffered questions: {e}")
 
-    update.message.reply_text(text)
+    send_inbox(update.message, speech, telegram_id)
 
 
 def subscribe_to_next_events(update: Update, context: CallbackContext) -> None:
     user = update.effective_user
 
-    event = Event.objects.filter(is_active=True).first()
+    event = get_current_event()
     if not event:
         event = Event.objects.order_by("-date").first()
 
@@ -259,13 +275,7 @@ def subscribe_to_next_events(update: Update, context: CallbackContext) -> None:
         )
         return
 
-    participant, _ = Participant.objects.get_or_create(
-        telegram_id=user.id,
-        defaults={
-            "username": user.username,
-            "full_name": f"{user.first_name} {user.last_name or ''}".strip(),
-        },
-    )
+    participant = participant_cache.get_or_create(user)
 
     subscription, created = Subscription.objects.get_or_create(
         participant=participant,
@@ -296,7 +306,9 @@ def unsubscribe_from_events(update: Update, context: CallbackContext) -> None:
     user = update.effective_user
     
     try:
-        participant = Participant.objects.get(telegram_id=user.id)
+        participant = participant_cache.get(user.id)
+        if participant is None:
+            raise Participant.DoesNotExist
         subscriptions = Subscription.objects.filter(participant=participant)
         
         if not subscriptions.exists():
@@ -321,12 +333,22 @@ def unsubscribe_from_events(update: Update, context: CallbackContext) -> None:
         update.message.reply_text("Произошла ошибка. Попробуй позже.")
 
 
+SETTING_FIELDS = ('notify_program_changes', 'notify_new_events', 'notify_reminders')
+SETTING_CALLBACKS = {
+    'toggle_program_': 'notify_program_changes',
+    'toggle_events_': 'notify_new_events',
+    'toggle_reminders_': 'notify_reminders',
+}
+
+
 def notification_settings(update: Update, context: CallbackContext) -> None:
     user = update.effective_user
     
     try:
-        participant = Participant.objects.get(telegram_id=user.id)
-        event = Event.objects.filter(is_active=True).first()
+        participant = participant_cache.get(user.id)
+        if participant is None:
+            raise Participant.DoesNotExist
+        event = get_current_event()
         
         if not event:
             update.message.reply_text("Сейчас нет активных мероприятий.")
@@ -342,40 +364,11 @@ def notification_settings(update: Update, context: CallbackContext) -> None:
             }
         )
         
-        keyboard = [
-            [
-                InlineKeyboardButton(
-                    "ВКЛ" if subscription.notify_program_changes else "ВЫКЛ",
-                    callback_data=f"toggle_program_{subscription.id}"
-                ),
-                InlineKeyboardButton("Изменения программы", callback_data="info_program")
-            ],
-            [
-                InlineKeyboardButton(
-                    "ВКЛ" if subscription.notify_new_events else "ВЫКЛ", 
-                    callback_data=f"toggle_events_{subscription.id}"
-                ),
-                InlineKeyboardButton("Новые мероприятия", callback_data="info_events")
-            ],
-            [
-                InlineKeyboardButton(
-                    "ВКЛ" if subscription.notify_reminders else "ВЫКЛ",
-                    callback_data=f"toggle_reminders_{subscription.id}"
-                ),
-                InlineKeyboardButton("Напоминания", callback_data="info_reminders")
-            ],
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        status_text = (
-            f"*Настройки уведомлений для {event.title}*\n\n"
-            f"Изменения программы: {'ВКЛ' if subscription.notify_program_changes else 'ВЫКЛ'}\n"
-            f"Новые мероприятия: {'ВКЛ' if subscription.notify_new_events else 'ВЫКЛ'}\n"
-            f"Напоминания: {'ВКЛ' if subscription.notify_reminders else 'ВЫКЛ'}\n\n"
-            "Нажми на кнопку ВКЛ/ВЫКЛ чтобы изменить настройку"
+        status_text, reply_markup = render_settings(
+            subscription.id,
+            tuple(getattr(subscription, field) for field in SETTING_FIELDS),
+            f"*Настройки уведомлений для {event.title}*"
         )
-        
         update.message.reply_text(status_text, reply_markup=reply_markup, parse_mode='Markdown')
         
     except Participant.DoesNotExist:
@@ -387,23 +380,15 @@ def notification_settings(update: Update, context: CallbackContext) -> None:
 
 def handle_settings_callback(update: Update, context: CallbackContext) -> None:
     query = update.callback_query
-    query.answer()
-    
     data = query.data
     
-    if data.startswith('toggle_program_'):
-        subscription_id = data.replace('toggle_program_', '')
-        _toggle_setting(query, subscription_id, 'notify_program_changes')
-        
-    elif data.startswith('toggle_events_'):
-        subscription_id = data.replace('toggle_events_', '')
-        _toggle_setting(query, subscription_id, 'notify_new_events')
-        
-    elif data.startswith('toggle_reminders_'):
-        subscription_id = data.replace('toggle_reminders_', '')
-        _toggle_setting(query, subscription_id, 'notify_reminders')
+    for prefix, setting_name in SETTING_CALLBACKS.items():
+        if data.startswith(prefix):
+            query.answer()
+            _toggle_setting(query, data.replace(prefix, ''), setting_name)
+            return
         
-    elif data.startswith('info_'):
+    if data.startswith('info_'):
         info_text = {
             'info_program': 'Получать уведомления об изменениях в программе мероприятия',
             'info_events': 'Получать уведомления о новых мероприятиях',
@@ -412,51 +397,74 @@ def handle_settings_callback(update: Update, context: CallbackContext) -> None:
         query.answer(info_text.get(data, "Информация"), show_alert=True)
 
 
+@lru_cache(maxsize=8)
+def _settings_view(flags):
+    """Текст и подписи кнопок для одной из 8 комбинаций флагов."""
+    labels = tuple("ВКЛ" if flag else "ВЫКЛ" for flag in flags)
+    program, events, reminders = labels
+    body = (
+        f"Изменения программы: {program}\n"
+        f"Новые мероприятия: {events}\n"
+        f"Напоминания: {reminders}\n\n"
+        "Нажми на кнопку ВКЛ/ВЫКЛ чтобы изменить настройку"
+    )
+    return body, labels
+
+
+def render_settings(subscription_id, flags, header="*Настройки уведомлений*"):
+    body, (program, events, reminders) = _settings_view(flags)
+    keyboard = [
+        [
+            InlineKeyboardButton(program, callback_data=f"toggle_program_{subscription_id}"),
+            InlineKeyboardButton("Изменения программы", callback_data="info_program")
+        ],
+        [
+            InlineKeyboardButton(events, callback_data=f"toggle_events_{subscription_id}"),
+            InlineKeyboardButton("Новые мероприятия", callback_data="info_events")
+        ],
+        [
+            InlineKeyboardButton(reminders, callback_data=f"toggle_reminders_{subscription_id}"),
+            InlineKeyboardButton("Напоминания", callback_data="info_reminders")
+        ],
+    ]
+    return f"{header}\n\n{body}", InlineKeyboardMarkup(keyboard)
+
+
+def toggle_subscription_setting(subscription_id, telegram_id, setting_name):
+    """Инвертирует флаг подписки одним UPDATE и возвращает новые значения всех флагов.
+
+    Двойное нажатие не затирает изменения: каждое нажатие атомарно
+    переключает значение в базе. Возвращает None, если подписка не найдена
+    или принадлежит другому пользователю.
+    """
+    if setting_name not in SETTING_FIELDS:
+        raise ValueError(f"Unknown setting: {setting_name}")
+
+    quote = connection.ops.quote_name
+    column = quote(Subscription._meta.get_field(setting_name).column)
+    returned = ", ".join(quote(Subscription._meta.get_field(field).column) for field in SETTING_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {quote(Subscription._meta.db_table)} SET {column} = NOT {column} "
+            f"WHERE id = %s AND participant_id IN ("
+            f"SELECT id FROM {quote(Participant._meta.db_table)} WHERE telegram_id = %s"
+            f") RETURNING {returned}",
+            [subscription_id, telegram_id]
+        )
+        row = cursor.fetchone()
+    return tuple(bool(value) for value in row) if row else None
+
+
 def _toggle_setting(query, subscription_id, setting_name):
     try:
-        subscription = Subscription.objects.get(id=subscription_id)
-        current_value = getattr(subscription, setting_name)
-        setattr(subscription, setting_name, not current_value)
-        subscription.save()
-        
-        keyboard = [
-            [
-                InlineKeyboardButton(
-                    "ВКЛ" if subscription.notify_program_changes else "ВЫКЛ",
-                    callback_data=f"toggle_program_{subscription.id}"
-                ),
-                InlineKeyboardButton("Изменения программы", callback_data="info_program")
-            ],
-            [
-                InlineKeyboardButton(
-                    "ВКЛ" if subscription.notify_new_events else "ВЫКЛ", 
-                    callback_data=f"toggle_events_{subscription.id}"
-                ),
-                InlineKeyboardButton("Новые мероприятия", callback_data="info_events")
-            ],
-            [
-                InlineKeyboardButton(
-                    "ВКЛ" if subscription.notify_reminders else "ВЫКЛ",
-                    callback_data=f"toggle_reminders_{subscription.id}"
-                ),
-                InlineKeyboardButton("Напоминания", callback_data="info_reminders")
-            ],
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        status_text = (
-            f"*Настройки уведомлений*\n\n"
-            f"Изменения программы: {'ВКЛ' if subscription.notify_program_changes else 'ВЫКЛ'}\n"
-            f"Новые мероприятия: {'ВКЛ' if subscription.notify_new_events else 'ВЫКЛ'}\n"
-            f"Напоминания: {'ВКЛ' if subscription.notify_reminders else 'ВЫКЛ'}\n\n"
-            "Нажми на кнопку ВКЛ/ВЫКЛ чтобы изменить настройку"
-        )
-        
+        flags = toggle_subscription_setting(int(subscription_id), query.from_user.id, setting_name)
+        if flags is None:
+            query.edit_message_text("Ошибка: подписка не найдена")
+            return
+
+        status_text, reply_markup = render_settings(subscription_id, flags)
         query.edit_message_text(status_text, reply_markup=reply_markup, parse_mode='Markdown')
         
-    except Subscription.DoesNotExist:
-        query.edit_message_text("Ошибка: подписка не найдена")
     except Exception as e:
         logger.error(f"Error toggling setting: {e}")
         query.edit_message_text("Произошла ошибка. Попробуй позже.")
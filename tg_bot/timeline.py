@@ -0,0 +1,59 @@
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+
+from datacenter.models import Speech
+from .cache import SPEECH_TIMELINE_VERSION_KEY, LocalCache
+
+
+class SpeechTimeline:
+    """Отсортированный по началу список выступлений одного дня.
+
+    max_ends[i] — самое позднее окончание среди первых i + 1 выступлений,
+    по нему поиск останавливается, как только раньше нет ни одного
+    выступления, которое ещё идёт.
+    """
+
+    def __init__(self, day, speeches):
+        self.day = day
+        self.speeches = sorted(speeches, key=lambda speech: (speech.start_time, speech.id))
+        self.starts = [speech.start_time for speech in self.speeches]
+        self.by_id = {speech.id: speech for speech in self.speeches}
+        self.max_ends = []
+        latest_end = None
+        for speech in self.speeches:
+            latest_end = speech.end_time if latest_end is None else max(latest_end, speech.end_time)
+            self.max_ends.append(latest_end)
+
+    def active_at(self, now):
+        index = bisect_right(self.starts, now) - 1
+        while index >= 0 and self.max_ends[index] >= now:
+            speech = self.speeches[index]
+            if speech.end_time >= now:
+                return speech
+            index -= 1
+        return None
+
+    def get(self, speech_id):
+        return self.by_id.get(speech_id)
+
+
+def _load_timeline():
+    day = timezone.localdate()
+    day_start = timezone.make_aware(datetime.combine(day, time.min))
+    day_end = day_start + timedelta(days=1)
+    speeches = Speech.objects.filter(
+        start_time__lt=day_end,
+        end_time__gte=day_start
+    ).select_related("speaker")
+    return SpeechTimeline(day, list(speeches))
+
+
+_timeline_cache = LocalCache(SPEECH_TIMELINE_VERSION_KEY, _load_timeline)
+
+
+def get_timeline():
+    timeline = _timeline_cache.get()
+    if timeline.day != timezone.localdate():
+        timeline = _timeline_cache.reload()
+    return timeline
@@ -0,0 +1,100 @@
+import hmac
+import json
+import logging
+import queue
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram import Update
+
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Обновления Telegram маленькие, всё крупнее — не от Telegram
+MAX_BODY_SIZE = 1024 * 1024
+# Сколько ждать места в очереди, прежде чем попросить Telegram повторить позже
+DEFAULT_PUT_TIMEOUT = 1.0
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    server_version = "MeetupBotWebhook"
+
+    def do_POST(self):
+        if self.path != self.server.webhook_path:
+            self._reply(HTTPStatus.NOT_FOUND)
+            return
+
+        if self.server.secret_token and not hmac.compare_digest(
+            self.headers.get(SECRET_TOKEN_HEADER, ""), self.server.secret_token
+        ):
+            self._reply(HTTPStatus.FORBIDDEN)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_SIZE:
+            self._reply(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            return
+
+        try:
+            update = Update.de_json(json.loads(self.rfile.read(length)), self.server.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Malformed webhook update: {e}")
+            self._reply(HTTPStatus.BAD_REQUEST)
+            return
+
+        try:
+            self.server.update_queue.put(update, timeout=self.server.put_timeout)
+        except queue.Full:
+            # Telegram повторит доставку сам, пока обработчики разбирают очередь
+            logger.warning("Update queue is full, asking Telegram to retry later")
+            self._reply(HTTPStatus.SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+            return
+
+        self._reply(HTTPStatus.OK)
+
+    def _reply(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """HTTP-сервер, принимающий обновления от Telegram в очередь диспетчера.
+
+    Очередь ограничена: если обработчики не успевают, запрос ждёт
+    put_timeout секунд и получает 503, после чего Telegram присылает
+    обновление повторно.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, bot, update_queue, host="127.0.0.1", port=8080, path="/telegram",
+                 secret_token=None, put_timeout=DEFAULT_PUT_TIMEOUT):
+        super().__init__((host, port), WebhookRequestHandler)
+        self.bot = bot
+        self.update_queue = update_queue
+        self.webhook_path = path
+        self.secret_token = secret_token
+        self.put_timeout = put_timeout
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="WebhookServer", daemon=True)
+        self.thread.start()
+        logger.info(f"Webhook server listening on {self.server_address[0]}:{self.server_address[1]}{self.webhook_path}")
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.thread:
+            self.thread.join()
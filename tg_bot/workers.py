@@ -0,0 +1,53 @@
+import logging
+import threading
+
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicWorker(threading.Thread):
+    """Фоновый поток, который раз в interval секунд вызывает run_once()."""
+
+    interval = 1.0
+
+    def __init__(self, interval=None):
+        super().__init__(name=self.__class__.__name__, daemon=True)
+        if interval is not None:
+            self.interval = interval
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+
+    def wakeup(self):
+        self.wake_event.set()
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def on_stop(self):
+        pass
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception(f"Error in {self.name}")
+            finally:
+                close_old_connections()
+            self.wake_event.wait(self.interval)
+            self.wake_event.clear()
+
+        try:
+            self.on_stop()
+        except Exception:
+            logger.exception(f"Error while stopping {self.name}")
+        finally:
+            close_old_connections()
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.is_alive():
+            self.join(timeout)